@@ -1,13 +1,32 @@
+import hashlib
+import os
+import time
+import uuid
 import streamlit as st
 from textwrap import dedent
 from utils.pdf_processor import extract_text_from_pdf
 from services.gemini_llm import (
+    add_rag_index_to_store,
     answer_question_with_rag,
     build_rag_index,
     generate_infographic_image,
     generate_podcast_script,
+    generate_script_and_outline,
+    get_retrieval_latency_stats,
 )
-from services.google_tts import text_to_audio
+from services.chat_memory import ChatMemory
+from services.rag_snapshot import load_or_build_rag_index
+from services.google_tts import AUDIO_FORMATS, encode_audio, iter_audio_segments, join_audio_segments
+from services.rate_limiter import get_rate_limiter
+from services.usage_ledger import get_usage_ledger, usage_context
+from services.vector_store import get_vector_store
+from utils.artifact_store import get_artifact_store
+
+run_cpu_started = time.thread_time()
+
+# Mensajes del chat que se conservan y re-renderizan; la conversacion completa vive
+# resumida en ChatMemory, con tamano acotado.
+MAX_CHAT_MESSAGES = 20
 
 # --- Configuracion de Pagina ---
 st.set_page_config(
@@ -17,9 +36,8 @@ st.set_page_config(
 )
 
 
-st.markdown(
-    dedent(
-        """
+PAGE_CSS = dedent(
+    """
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Hind+Madurai:wght@300;400;500;600;700&family=Lora:wght@400;500;600;700&family=Montserrat:wght@500;600;700;800&display=swap');
 
@@ -131,15 +149,25 @@ div[data-testid="stTextInput"] label p {
 }
 </style>
 """
-    ),
-    unsafe_allow_html=True,
 )
 
+st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
 # --- Estado de la Sesion ---
+# Los artefactos pesados (texto, indice, audio, imagen) viven en el almacen compartido;
+# la sesion solo guarda sus handles.
+artifact_store = get_artifact_store()
+artifact_store.evict_idle_sessions()
+
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+artifact_store.touch_session(st.session_state["session_id"])
 if "script" not in st.session_state:
     st.session_state["script"] = None
 if "audio_file" not in st.session_state:
     st.session_state["audio_file"] = None
+if "audio_format" not in st.session_state:
+    st.session_state["audio_format"] = "mp3"
 if "infographic_image" not in st.session_state:
     st.session_state["infographic_image"] = None
 if "pdf_text" not in st.session_state:
@@ -150,6 +178,203 @@ if "rag_index" not in st.session_state:
     st.session_state["rag_index"] = None
 if "chat_messages" not in st.session_state:
     st.session_state["chat_messages"] = []
+if "chat_memory" not in st.session_state:
+    st.session_state["chat_memory"] = ChatMemory()
+
+
+def save_artifact(name, value, prefer_disk=False, extension=None):
+    st.session_state[name] = artifact_store.put(
+        st.session_state["session_id"],
+        name,
+        value,
+        prefer_disk=prefer_disk,
+        extension=extension,
+    )
+
+
+def load_artifact(name):
+    return artifact_store.get(st.session_state[name])
+
+
+def document_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def document_usage_context(text):
+    """Asocia las llamadas a Gemini del bloque a esta sesion y al documento (hash del texto)."""
+    return usage_context(session_id=st.session_state["session_id"], document_hash=document_hash(text))
+
+
+def media_source(name):
+    """
+    Ruta en disco del artefacto si esta volcado; si no, sus bytes. En ambos casos Streamlit copia
+    el medio a su almacen en memoria y el navegador lo pide por URL (/media), fuera del mensaje.
+    """
+    return artifact_store.get_path(st.session_state[name]) or load_artifact(name)
+
+
+def deferred_artifact(name):
+    """Datos para st.download_button: el artefacto solo se lee cuando el usuario descarga."""
+    handle = st.session_state[name]
+    return lambda: artifact_store.get(handle) or b""
+
+
+def record_render(scope, cpu_started):
+    """Guarda el CPU de la ultima ejecucion de cada zona de la pagina y cuantas veces se ejecuto."""
+    metrics = st.session_state.setdefault("render_metrics", {})
+    previous = metrics.get(scope, {"runs": 0})
+    metrics[scope] = {
+        "runs": previous["runs"] + 1,
+        "cpu_ms": (time.thread_time() - cpu_started) * 1000.0,
+    }
+
+
+# Chat y resultados se ejecutan como fragmentos: una pregunta solo re-renderiza el chat,
+# sin volver a inyectar el CSS ni volver a registrar el audio y la imagen.
+@st.fragment
+def render_chat(clean_key):
+    cpu_started = time.thread_time()
+
+    st.markdown("### Chat con tu PDF (RAG)")
+
+    if not clean_key:
+        st.info("Introduce tu API key para activar el chat sobre el PDF.")
+
+    chat_memory = st.session_state["chat_memory"]
+    hidden_turns = len(chat_memory) - len(st.session_state["chat_messages"]) // 2
+    if hidden_turns > 0:
+        st.caption(f"{hidden_turns} preguntas anteriores se conservan resumidas como contexto.")
+
+    for message in st.session_state["chat_messages"]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    # Con PAPER_TO_PODCAST_LIBRARY_DIR, cada PDF indexado se agrega a una biblioteca compartida.
+    library = get_vector_store()
+    search_library = False
+    if library is not None and len(library.list_documents()) > 1:
+        search_library = st.checkbox(
+            "Buscar en toda la biblioteca de PDFs",
+            help=f"{len(library.list_documents())} documentos indexados.",
+        )
+
+    question = st.chat_input("Haz una pregunta especifica sobre el PDF...")
+    if question:
+        st.session_state["chat_messages"].append({"role": "user", "content": question})
+        with st.chat_message("user"):
+            st.markdown(question)
+
+        with st.chat_message("assistant"):
+            pdf_text = load_artifact("pdf_text")
+            if not clean_key:
+                answer = "Necesito una API key de Google valida para responder."
+            elif not pdf_text:
+                answer = "No hay contenido del PDF disponible para consultar."
+            else:
+                rag_index = load_artifact("rag_index")
+                if rag_index is None:
+                    with st.spinner("Indexando PDF para RAG..."), document_usage_context(pdf_text):
+                        # Con PAPER_TO_PODCAST_INDEX_DIR, el indice se comparte entre sesiones y reinicios.
+                        index_dir = os.environ.get("PAPER_TO_PODCAST_INDEX_DIR")
+                        if index_dir:
+                            rag_index = load_or_build_rag_index(pdf_text, clean_key, index_dir)
+                        else:
+                            rag_index = build_rag_index(
+                                pdf_text,
+                                clean_key,
+                            )
+                        save_artifact("rag_index", rag_index)
+                        if library is not None and document_hash(pdf_text) not in library.list_documents():
+                            add_rag_index_to_store(
+                                library,
+                                document_hash(pdf_text),
+                                rag_index,
+                                metadata={"name": (st.session_state["pdf_token"] or "").rsplit(":", 1)[0]},
+                            )
+                    dedup_stats = rag_index.get("dedup", {})
+                    if dedup_stats.get("embedding_calls_saved") or dedup_stats.get("header_lines_removed"):
+                        st.caption(
+                            f"Indexado: {dedup_stats['chunks_after']} fragmentos unicos; "
+                            f"{dedup_stats['embedding_calls_saved']} llamadas de embedding ahorradas, "
+                            f"{dedup_stats['header_lines_removed']} lineas de cabecera/pie eliminadas."
+                        )
+                with st.spinner("Buscando en el documento..."), document_usage_context(pdf_text):
+                    answer = answer_question_with_rag(
+                        question=question,
+                        rag_index=rag_index,
+                        api_key=clean_key,
+                        vector_store=library if search_library else None,
+                        history=chat_memory,
+                    )
+                if not answer.startswith("Error en Gemini:"):
+                    chat_memory.add_turn(question, answer)
+
+            st.markdown(answer)
+            st.session_state["chat_messages"].append({"role": "assistant", "content": answer})
+            del st.session_state["chat_messages"][:-MAX_CHAT_MESSAGES]
+
+    record_render("chat", cpu_started)
+
+
+@st.fragment
+def render_results():
+    if not st.session_state["script"]:
+        return
+
+    cpu_started = time.thread_time()
+
+    st.markdown("### Tu Podcast")
+
+    # Reproductor de Audio
+    audio_source = media_source("audio_file") if st.session_state["audio_file"] else None
+    if audio_source is not None:
+        audio_settings = AUDIO_FORMATS[st.session_state["audio_format"]]
+        st.audio(audio_source, format=audio_settings["mime"])
+
+        # Boton de descarga (el archivo se lee al descargar, no en cada ejecucion)
+        st.download_button(
+            label=f"Descargar {audio_settings['extension'].upper()}",
+            data=deferred_artifact("audio_file"),
+            file_name=f"mi_podcast.{audio_settings['extension']}",
+            mime=audio_settings["mime"]
+        )
+    else:
+        st.session_state["audio_file"] = None
+
+    st.markdown("---")
+
+    image_source = media_source("infographic_image") if st.session_state["infographic_image"] else None
+    if image_source is not None:
+        st.markdown("### Tu Infografia")
+        st.image(
+            image_source,
+            caption="Infografia generada con IA de Google",
+            use_container_width=True,
+        )
+        st.download_button(
+            label="Descargar Infografia (PNG)",
+            data=deferred_artifact("infographic_image"),
+            file_name="infografia.png",
+            mime="image/png",
+        )
+        st.markdown("---")
+    else:
+        st.session_state["infographic_image"] = None
+
+    # Mostrar el Guion
+    with st.expander("Ver el guion generado"):
+        st.write(st.session_state["script"])
+
+    record_render("results", cpu_started)
+
+
+# Si la sesion estuvo inactiva y sus datos se expulsaron, forzamos a releer el PDF
+# y olvidamos los handles de audio e imagen que ya no tienen datos.
+if st.session_state["pdf_token"] and not artifact_store.exists(st.session_state["pdf_text"]):
+    st.session_state["pdf_token"] = None
+for artifact_name in ("audio_file", "infographic_image"):
+    if st.session_state[artifact_name] and not artifact_store.exists(st.session_state[artifact_name]):
+        st.session_state[artifact_name] = None
 
 # --- Interfaz Principal ---
 
@@ -183,26 +408,42 @@ if uploaded_file is not None:
     if st.session_state["pdf_token"] != current_pdf_token:
         raw_text = extract_text_from_pdf(uploaded_file)
         if raw_text.startswith("Error al leer el PDF:"):
-            st.session_state["pdf_text"] = None
+            save_artifact("pdf_text", None)
             st.session_state["pdf_token"] = None
-            st.session_state["rag_index"] = None
+            save_artifact("rag_index", None)
             st.session_state["chat_messages"] = []
+            st.session_state["chat_memory"] = ChatMemory()
             st.error(raw_text)
             st.stop()
 
         st.session_state["pdf_token"] = current_pdf_token
-        st.session_state["pdf_text"] = raw_text
-        st.session_state["rag_index"] = None
+        save_artifact("pdf_text", raw_text)
+        save_artifact("rag_index", None)
         st.session_state["chat_messages"] = []
+        st.session_state["chat_memory"] = ChatMemory()
         st.session_state["script"] = None
-        st.session_state["audio_file"] = None
-        st.session_state["infographic_image"] = None
+        save_artifact("audio_file", None)
+        save_artifact("infographic_image", None)
 
-    if st.session_state["pdf_text"]:
+    pdf_text = load_artifact("pdf_text")
+    if pdf_text:
         st.caption(
-            f"PDF listo para preguntas ({len(st.session_state['pdf_text'].split()):,} palabras extraidas)."
+            f"PDF listo para preguntas ({len(pdf_text.split()):,} palabras extraidas)."
         )
 
+    audio_format_choice = st.radio(
+        "Formato de audio",
+        options=["mp3", "opus"],
+        format_func=lambda fmt: "MP3" if fmt == "mp3" else "Opus (mas ligero)",
+        horizontal=True,
+        help="Opus reduce el tamano de descarga en podcasts largos (requiere pydub y ffmpeg).",
+    )
+
+    fused_generation = st.checkbox(
+        "Modo rapido: guion e infografia en una sola llamada",
+        help="Envia el documento a Gemini una sola vez; si la respuesta no es valida, se usan llamadas separadas.",
+    )
+
     # Boton de Procesamiento
     if st.button("Generar Podcast e Infografia"):
         clean_key = api_key.strip()
@@ -210,128 +451,145 @@ if uploaded_file is not None:
             st.warning("Introduce tu API key para continuar.")
         else:
             with st.status("Analizando documento...", expanded=True) as status:
-                raw_text = st.session_state["pdf_text"]
+                raw_text = load_artifact("pdf_text")
                 if not raw_text:
                     st.session_state["script"] = None
-                    st.session_state["audio_file"] = None
-                    st.session_state["infographic_image"] = None
+                    save_artifact("audio_file", None)
+                    save_artifact("infographic_image", None)
                     status.update(label="No se pudo leer el PDF", state="error", expanded=True)
                     st.error("No se encontro texto valido en el PDF.")
                     st.stop()
 
                 st.write("Gemini esta escribiendo el guion...")
-                script = generate_podcast_script(raw_text, clean_key)
+                # Si el chat ya indexo el PDF, reutilizamos sus embeddings para elegir el contexto.
+                rag_index = load_artifact("rag_index")
+                outline = None
+                with document_usage_context(raw_text):
+                    if fused_generation:
+                        script, outline = generate_script_and_outline(raw_text, clean_key, rag_index=rag_index)
+                    else:
+                        script = generate_podcast_script(raw_text, clean_key, rag_index=rag_index)
 
                 if not script:
                     st.session_state["script"] = None
-                    st.session_state["audio_file"] = None
-                    st.session_state["infographic_image"] = None
+                    save_artifact("audio_file", None)
+                    save_artifact("infographic_image", None)
                     status.update(label="No se pudo generar el guion", state="error", expanded=True)
                     st.error("API key invalida o error de conexion con Gemini.")
                 elif script.startswith("Error en Gemini:"):
                     st.session_state["script"] = None
-                    st.session_state["audio_file"] = None
-                    st.session_state["infographic_image"] = None
+                    save_artifact("audio_file", None)
+                    save_artifact("infographic_image", None)
                     status.update(label="Error de Gemini", state="error", expanded=True)
                     st.error(script)
                 else:
                     st.session_state["script"] = script
 
                     st.write("Generando infografia...")
-                    infographic_image = generate_infographic_image(raw_text, clean_key)
+                    with document_usage_context(raw_text):
+                        infographic_image = generate_infographic_image(
+                            raw_text,
+                            clean_key,
+                            rag_index=rag_index,
+                            outline=outline,
+                        )
                     if isinstance(infographic_image, str) and infographic_image.startswith("Error en Imagen:"):
-                        st.session_state["infographic_image"] = None
+                        save_artifact("infographic_image", None)
                         st.warning(infographic_image)
                     else:
-                        st.session_state["infographic_image"] = infographic_image
+                        save_artifact("infographic_image", infographic_image, prefer_disk=True, extension="png")
 
                     st.write("Generando voces...")
-                    audio_bytes = text_to_audio(script)
-
-                    if audio_bytes is None:
-                        st.session_state["audio_file"] = None
+                    # Cada segmento se reproduce en cuanto esta listo, sin esperar al audio completo.
+                    # Si un segmento falla tras sus reintentos, se conservan los ya generados.
+                    audio_segments = []
+                    audio_error = None
+                    try:
+                        for idx, segment in enumerate(iter_audio_segments(script), start=1):
+                            audio_segments.append(segment)
+                            st.caption(f"Parte {idx}")
+                            st.audio(segment, format="audio/mp3")
+                    except Exception as tts_error:
+                        audio_error = tts_error
+
+                    if not audio_segments:
+                        save_artifact("audio_file", None)
                         status.update(label="No se pudo generar el audio", state="error", expanded=True)
                         st.error("Error al convertir el guion a audio.")
                     else:
-                        st.session_state["audio_file"] = audio_bytes
-                        status.update(label="Podcast listo", state="complete", expanded=False)
-
-    st.markdown("### Chat con tu PDF (RAG)")
-
-    clean_key = api_key.strip()
-    if not clean_key:
-        st.info("Introduce tu API key para activar el chat sobre el PDF.")
-
-    for message in st.session_state["chat_messages"]:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-
-    question = st.chat_input("Haz una pregunta especifica sobre el PDF...")
-    if question:
-        st.session_state["chat_messages"].append({"role": "user", "content": question})
-        with st.chat_message("user"):
-            st.markdown(question)
-
-        with st.chat_message("assistant"):
-            if not clean_key:
-                answer = "Necesito una API key de Google valida para responder."
-            elif not st.session_state["pdf_text"]:
-                answer = "No hay contenido del PDF disponible para consultar."
-            else:
-                if st.session_state["rag_index"] is None:
-                    with st.spinner("Indexando PDF para RAG..."):
-                        st.session_state["rag_index"] = build_rag_index(
-                            st.session_state["pdf_text"],
-                            clean_key,
+                        audio_file, audio_format = encode_audio(
+                            join_audio_segments(audio_segments),
+                            audio_format_choice,
                         )
-                with st.spinner("Buscando en el documento..."):
-                    answer = answer_question_with_rag(
-                        question=question,
-                        rag_index=st.session_state["rag_index"],
-                        api_key=clean_key,
-                    )
-
-            st.markdown(answer)
-            st.session_state["chat_messages"].append({"role": "assistant", "content": answer})
+                        save_artifact(
+                            "audio_file",
+                            audio_file,
+                            prefer_disk=True,
+                            extension=AUDIO_FORMATS[audio_format]["extension"],
+                        )
+                        st.session_state["audio_format"] = audio_format
+                        if audio_error is not None:
+                            status.update(label="Podcast listo (audio incompleto)", state="complete", expanded=True)
+                            st.warning(
+                                f"El audio se corto en la parte {len(audio_segments) + 1}: {audio_error}. "
+                                "Se guardaron las partes anteriores."
+                            )
+                        else:
+                            status.update(label="Podcast listo", state="complete", expanded=False)
+
+    render_chat(api_key.strip())
 else:
-    st.session_state["pdf_text"] = None
+    save_artifact("pdf_text", None)
     st.session_state["pdf_token"] = None
-    st.session_state["rag_index"] = None
+    save_artifact("rag_index", None)
     st.session_state["chat_messages"] = []
-
-# --- Visualizacion de Resultados ---
-if st.session_state["script"]:
-    st.markdown("### Tu Podcast")
-
-    # Reproductor de Audio
-    if st.session_state["audio_file"]:
-        st.audio(st.session_state["audio_file"], format="audio/mp3")
-
-        # Boton de descarga
-        st.download_button(
-            label="Descargar MP3",
-            data=st.session_state["audio_file"],
-            file_name="mi_podcast.mp3",
-            mime="audio/mp3"
-        )
-
-    st.markdown("---")
-
-    if st.session_state["infographic_image"]:
-        st.markdown("### Tu Infografia")
-        st.image(
-            st.session_state["infographic_image"],
-            caption="Infografia generada con IA de Google",
-            use_container_width=True,
+    st.session_state["chat_memory"] = ChatMemory()
+
+render_results()
+
+# --- Uso de recursos ---
+with st.expander("Uso de recursos"):
+    memory_usage = artifact_store.usage()
+    session_usage = memory_usage["sessions"].get(
+        st.session_state["session_id"],
+        {"memory_bytes": 0, "disk_bytes": 0, "artifacts": 0},
+    )
+    st.caption(
+        f"Esta sesion: {session_usage['memory_bytes'] / 1048576:.1f} MB en memoria, "
+        f"{session_usage['disk_bytes'] / 1048576:.1f} MB en disco ({session_usage['artifacts']} artefactos)."
+    )
+    st.caption(
+        f"Total del proceso: {memory_usage['memory_bytes'] / 1048576:.1f} MB de "
+        f"{memory_usage['budget_bytes'] / 1048576:.0f} MB en memoria, "
+        f"{memory_usage['disk_bytes'] / 1048576:.1f} MB en disco, "
+        f"{len(memory_usage['sessions'])} sesiones."
+    )
+    rate_metrics = get_rate_limiter().metrics()
+    st.caption(
+        f"Cola de llamadas a Gemini: {sum(m['queue_depth'] for m in rate_metrics.values())} en espera, "
+        f"espera p95 maxima {max([m['wait_p95_seconds'] for m in rate_metrics.values()] or [0.0]):.2f} s."
+    )
+    retrieval_latency = get_retrieval_latency_stats()
+    if retrieval_latency["count"]:
+        st.caption(
+            f"Busqueda en el PDF: p50 {retrieval_latency['p50_ms']:.0f} ms, "
+            f"p99 {retrieval_latency['p99_ms']:.0f} ms ({retrieval_latency['count']} preguntas)."
         )
-        st.download_button(
-            label="Descargar Infografia (PNG)",
-            data=st.session_state["infographic_image"],
-            file_name="infografia.png",
-            mime="image/png",
+    token_usage = get_usage_ledger().summary(group_by="stage", session_id=st.session_state["session_id"])
+    if token_usage:
+        st.caption(
+            "Tokens de esta sesion (entrada/salida): "
+            + ", ".join(
+                f"{row['stage']} {row['input_tokens']:,}/{row['output_tokens']:,}" for row in token_usage
+            )
+            + "."
         )
-        st.markdown("---")
-
-    # Mostrar el Guion
-    with st.expander("Ver el guion generado"):
-        st.write(st.session_state["script"])
+    for scope, label in (("page", "pagina completa"), ("chat", "chat"), ("results", "resultados")):
+        render = st.session_state.get("render_metrics", {}).get(scope)
+        if render:
+            st.caption(
+                f"Ultima ejecucion de {label}: {render['cpu_ms']:.1f} ms de CPU ({render['runs']} ejecuciones)."
+            )
+
+# Las ejecuciones completas (CSS y resto de la pagina) se cuentan aparte de los fragmentos.
+record_render("page", run_cpu_started)
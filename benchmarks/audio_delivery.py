@@ -0,0 +1,98 @@
+"""
+Benchmark de entrega de audio.
+
+Mide el tiempo hasta el primer audio reproducible (sintesis completa vs. por segmentos)
+y los bytes por minuto de audio para cada formato de salida.
+
+Uso:
+    python -m benchmarks.audio_delivery [ruta_guion.txt]
+
+Requiere conexion a internet (gTTS). Para el formato Opus se necesita pydub + ffmpeg.
+"""
+import sys
+import time
+
+from services.google_tts import (
+    AUDIO_FORMATS,
+    encode_audio,
+    iter_audio_segments,
+    join_audio_segments,
+    text_to_audio,
+)
+from utils.backends import get_backend
+
+# gTTS entrega MP3 mono a 32 kbps; se usa para estimar duracion cuando no hay pydub.
+GTTS_MP3_BITRATE_BPS = 32000
+
+SAMPLE_SCRIPT = """Alex: Hola a todos y bienvenidos a un nuevo episodio. Hoy hablamos de un articulo sobre modelos de lenguaje.
+Sam: Gracias, Alex. El articulo propone una forma mas eficiente de entrenar modelos con menos datos.
+
+Alex: Y cual es el primer punto importante?
+Sam: Que la calidad de los datos importa mas que la cantidad. Filtrar bien el corpus reduce el coste de entrenamiento.
+
+Alex: Interesante. Cual es el segundo?
+Sam: Que los modelos pequenos, bien ajustados, pueden competir con modelos mucho mayores en tareas concretas.
+
+Alex: Y el tercero?
+Sam: Que la evaluacion debe hacerse con pruebas que el modelo no haya visto durante el entrenamiento.
+
+Alex: Muy claro. Gracias, Sam.
+Sam: Gracias a ti. Hasta el proximo episodio.
+"""
+
+
+def _duration_seconds(audio_fp, audio_format):
+    pydub = get_backend("pydub")
+    if pydub is not None:
+        audio_fp.seek(0)
+        file_format = "mp3" if audio_format == "mp3" else "ogg"
+        duration = len(pydub.AudioSegment.from_file(audio_fp, format=file_format)) / 1000.0
+        audio_fp.seek(0)
+        return duration
+    if audio_format != "mp3":
+        return None
+    return len(audio_fp.getvalue()) * 8 / GTTS_MP3_BITRATE_BPS
+
+
+def run(script):
+    start = time.perf_counter()
+    full_audio = text_to_audio(script)
+    full_seconds = time.perf_counter() - start
+    if full_audio is None:
+        print("No se pudo sintetizar el guion (revisa la conexion).")
+        return 1
+
+    start = time.perf_counter()
+    first_segment_seconds = None
+    segments = []
+    for segment in iter_audio_segments(script):
+        if first_segment_seconds is None:
+            first_segment_seconds = time.perf_counter() - start
+        segments.append(segment)
+    segmented_seconds = time.perf_counter() - start
+
+    print("Tiempo hasta el primer audio")
+    print(f"  completo:      {full_seconds:7.2f} s")
+    print(f"  por segmentos: {first_segment_seconds:7.2f} s ({len(segments)} segmentos, total {segmented_seconds:.2f} s)")
+
+    print("Bytes por minuto de audio")
+    joined = join_audio_segments(segments)
+    duration = _duration_seconds(joined, "mp3")
+    for audio_format in AUDIO_FORMATS:
+        encoded, effective_format = encode_audio(join_audio_segments(segments), audio_format)
+        if effective_format != audio_format:
+            print(f"  {audio_format:5}: no disponible (falta pydub/ffmpeg)")
+            continue
+        size = len(encoded.getvalue())
+        per_minute = size / (duration / 60.0) if duration else float("nan")
+        print(f"  {audio_format:5}: {size:,} bytes, {per_minute:,.0f} bytes/min")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as script_file:
+            script_text = script_file.read()
+    else:
+        script_text = SAMPLE_SCRIPT
+    sys.exit(run(script_text))
@@ -0,0 +1,163 @@
+"""
+Benchmark de arranque en frio.
+
+Importa en un proceso nuevo, con `python -X importtime`, los mismos modulos que importa
+app.py (streamlit incluido). Reporta el tiempo acumulado y los imports mas costosos, y
+falla (codigo 1) si:
+- el mejor tiempo de N procesos empeora respecto a la linea base guardada mas alla de la tolerancia,
+- el tiempo supera `--budget-ms` (opcional), o
+- algun SDK pesado se importa al arrancar (deben cargarse en el primer uso).
+
+La linea base se graba con `--record-baseline` en la maquina donde se compara (CI o local) y
+no se versiona. Sin linea base la comprobacion falla, salvo que se pase `--budget-ms`.
+
+Uso:
+    python -m benchmarks.cold_start [--runs 5] [--record-baseline] [--tolerance 0.2] [--budget-ms N]
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+DEFAULT_BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "cold_start_baseline.json")
+
+# Estos SDKs solo deben importarse cuando se usan.
+LAZY_MODULES = ["google.generativeai", "google.genai", "gtts", "pydub", "PyPDF2"]
+
+DEFAULT_TOLERANCE = 0.2
+# Por debajo de este margen las diferencias son ruido de medicion.
+MIN_REGRESSION_MS = 10.0
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def app_imports(path=APP_PATH):
+    """Modulos que importa app.py a nivel de modulo, en orden."""
+    with open(path, encoding="utf-8") as handle:
+        tree = ast.parse(handle.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def measure_once(modules):
+    """Retorna ({modulo: microsegundos acumulados}, total_us) para un proceso nuevo."""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudieron importar los modulos de la app:\n{result.stderr.strip().splitlines()[-1]}")
+
+    cumulative = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, name = match.groups()
+        cumulative[name] = int(cumulative_us)
+        # Solo los imports de primer nivel suman al total (los anidados ya estan incluidos).
+        if len(indent) == 1:
+            total_us += int(cumulative_us)
+    return cumulative, total_us
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_baseline(path, best_ms, modules, cumulative):
+    payload = {
+        "best_ms": round(best_ms, 1),
+        "python": platform.python_version(),
+        "app_modules": modules,
+        "modules_ms": {name: round(value / 1000.0, 1) for name, value in cumulative.items() if value >= 1000},
+    }
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--record-baseline", action="store_true", help="guarda la medicion como nueva linea base")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="empeoramiento permitido (0.2 = 20%%)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="limite absoluto opcional")
+    args = parser.parse_args(argv)
+
+    modules = app_imports()
+    try:
+        runs = [measure_once(modules) for _ in range(max(1, args.runs))]
+    except RuntimeError as error:
+        print(f"ERROR: {error}")
+        return 1
+    # El mejor de N procesos es mas estable que la mediana frente a ruido de la maquina.
+    cumulative, best_us = min(runs, key=lambda run: run[1])
+    best_ms = best_us / 1000.0
+
+    print(f"Arranque en frio de app.py ({len(modules)} imports, mejor de {len(runs)}): {best_ms:.1f} ms")
+    print("Imports mas costosos:")
+    for name, value in sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {value / 1000.0:8.1f} ms  {name}")
+
+    failed = False
+    eager = [module for module in LAZY_MODULES if module in cumulative]
+    if eager:
+        print(f"ERROR: se importan al arrancar: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None and best_ms > args.budget_ms:
+        print(f"ERROR: el arranque supera el presupuesto de {args.budget_ms:.0f} ms.")
+        failed = True
+
+    if args.record_baseline:
+        save_baseline(args.baseline, best_ms, modules, cumulative)
+        print(f"Linea base guardada en {args.baseline}")
+        return 1 if failed else 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        if args.budget_ms is None:
+            print(f"ERROR: sin linea base en {args.baseline}; grabala con --record-baseline o pasa --budget-ms.")
+            return 1
+        print(f"Sin linea base en {args.baseline}; solo se comprueba el presupuesto.")
+        return 1 if failed else 0
+
+    limit_ms = max(baseline["best_ms"] * (1 + args.tolerance), baseline["best_ms"] + MIN_REGRESSION_MS)
+    print(f"Linea base: {baseline['best_ms']:.1f} ms (limite {limit_ms:.1f} ms)")
+    new_modules = [module for module in modules if module not in baseline.get("app_modules", [])]
+    if new_modules:
+        print(f"Imports nuevos desde la linea base: {', '.join(new_modules)}")
+    grown = []
+    for name, value in cumulative.items():
+        before_ms = baseline.get("modules_ms", {}).get(name, 0.0)
+        if value / 1000.0 - before_ms >= MIN_REGRESSION_MS:
+            grown.append((value / 1000.0 - before_ms, name))
+    for delta_ms, name in sorted(grown, reverse=True)[:args.top]:
+        print(f"  +{delta_ms:7.1f} ms  {name}")
+    if best_ms > limit_ms:
+        print("ERROR: el arranque empeoro respecto a la linea base.")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
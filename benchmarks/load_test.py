@@ -0,0 +1,310 @@
+"""
+Prueba de carga multi-sesion, sin red.
+
+Simula usuarios que recorren el flujo de la app (subir PDF -> generar podcast e infografia
+-> N preguntas al chat) usando el codigo real de `services/` y `utils/`. Gemini, los
+embeddings, la generacion de imagen y gTTS se sustituyen (via utils.backends) por
+versiones locales con latencia configurable.
+
+Reporta throughput, p50/p95/p99 por etapa, RSS maximo y numero maximo de hilos.
+
+Uso:
+    python -m benchmarks.load_test --users 20 --sessions 100 --questions 5
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from utils.backends import register_backend
+
+EMBEDDING_DIM = 64
+# Bytes de MP3 por caracter de guion (gTTS: ~32 kbps y ~15 caracteres por segundo de voz).
+TTS_BYTES_PER_CHAR = 270
+STAGES = ["upload", "script", "infographic", "audio", "index", "chat"]
+
+SAMPLE_OUTLINE = {
+    "title": "Titulo de prueba",
+    "subtitle": "Subtitulo de prueba",
+    "key_points": [{"heading": f"Punto {idx}", "detail": "Detalle breve del punto."} for idx in range(1, 5)],
+    "conclusion": "Conclusion de prueba.",
+}
+
+WORDS = (
+    "model training data attention transformer results experiment baseline accuracy dataset loss "
+    "gradient optimization evaluation benchmark retrieval embedding corpus token inference latency"
+).split()
+
+
+# --- Servicios locales ---
+
+class _Latency:
+    def __init__(self, mean_seconds, jitter=0.3, seed=None):
+        self.mean_seconds = mean_seconds
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self):
+        if self.mean_seconds <= 0:
+            return
+        with self._lock:
+            factor = 1.0 + self._rng.uniform(-self.jitter, self.jitter)
+        time.sleep(self.mean_seconds * factor)
+
+
+def _hashed_embedding(text):
+    """Embedding determinista tipo bag-of-words para que el retrieval tenga sentido."""
+    vector = [0.0] * EMBEDDING_DIM
+    for token in text.lower().split():
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest()
+        vector[int.from_bytes(digest, "big") % EMBEDDING_DIM] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def install_local_backends(llm_latency, embed_latency, image_latency, tts_latency):
+    """Registra stand-ins locales para los SDKs de Google y gTTS."""
+    llm = _Latency(llm_latency, seed=1)
+    embed = _Latency(embed_latency, seed=2)
+    image = _Latency(image_latency, seed=3)
+    tts = _Latency(tts_latency, seed=4)
+
+    class GenerativeModel:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+        def generate_content(self, prompt):
+            llm.sleep()
+            if "Translate the following user question" in prompt:
+                text = "translated question about the model results"
+            elif "guionista" in prompt:
+                text = "\n".join(
+                    f"{'Alex' if idx % 2 == 0 else 'Sam'}: " + " ".join(random.choices(WORDS, k=25))
+                    for idx in range(20)
+                )
+            else:
+                text = "Respuesta breve basada en el contexto. Fuentes: [C1]"
+            return types.SimpleNamespace(text=text)
+
+    def embed_content(model, content, task_type):
+        embed.sleep()
+        return {"embedding": _hashed_embedding(content)}
+
+    generativeai = types.SimpleNamespace(
+        configure=lambda api_key: None,
+        GenerativeModel=GenerativeModel,
+        embed_content=embed_content,
+    )
+
+    class _Models:
+        def generate_content(self, model, contents, config=None):
+            if config is not None:
+                image.sleep()
+                part = types.SimpleNamespace(
+                    inline_data=types.SimpleNamespace(mime_type="image/png", data=b"\x89PNG" + b"\0" * 200000),
+                )
+                return types.SimpleNamespace(parts=[part], candidates=None, text=None)
+            llm.sleep()
+            return types.SimpleNamespace(text=json.dumps(SAMPLE_OUTLINE), candidates=None)
+
+        def generate_images(self, model, prompt, config=None):
+            image.sleep()
+            return types.SimpleNamespace(generated_images=[])
+
+    class Client:
+        def __init__(self, api_key):
+            self.models = _Models()
+
+    genai_types = types.SimpleNamespace(
+        GenerateContentConfig=lambda **kwargs: types.SimpleNamespace(**kwargs),
+        GenerateImagesConfig=lambda **kwargs: types.SimpleNamespace(**kwargs),
+    )
+
+    class gTTS:
+        def __init__(self, text, lang="es", slow=False):
+            self.text = text
+
+        def write_to_fp(self, fp):
+            tts.sleep()
+            fp.write(b"\xff\xf3" * (len(self.text) * TTS_BYTES_PER_CHAR // 2))
+
+    class PdfReader:
+        def __init__(self, stream):
+            text = stream.read().decode("latin-1")
+            self.pages = [types.SimpleNamespace(extract_text=lambda page=page: page) for page in text.split("\f")]
+
+    register_backend("google.generativeai", lambda: generativeai)
+    register_backend("google.genai", lambda: types.SimpleNamespace(Client=Client))
+    register_backend("google.genai.types", lambda: genai_types)
+    register_backend("gtts", lambda: types.SimpleNamespace(gTTS=gTTS))
+    register_backend("pydub", lambda: None)
+    # El "PDF" de la prueba es texto plano con paginas separadas por '\f'.
+    register_backend("PyPDF2", lambda: types.SimpleNamespace(PdfReader=PdfReader))
+    register_backend("pypdfium2", lambda: None)
+    register_backend("pdfminer.high_level", lambda: None)
+
+
+def _synthetic_document(pages, seed):
+    rng = random.Random(seed)
+    page_texts = []
+    for page_number in range(1, pages + 1):
+        body = "\n".join(" ".join(rng.choices(WORDS, k=18)) for _ in range(25))
+        page_texts.append(f"Journal of Load Testing\n{body}\n{page_number}")
+    return "\f".join(page_texts).encode("latin-1")
+
+
+# --- Sesion simulada ---
+
+class _Recorder:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.errors = {stage: 0 for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, ok=True):
+        with self._lock:
+            self.samples[stage].append(seconds)
+            if not ok:
+                self.errors[stage] += 1
+
+
+def _timed(recorder, stage, func, *args, **kwargs):
+    started = time.perf_counter()
+    ok = True
+    try:
+        result = func(*args, **kwargs)
+        ok = not (isinstance(result, str) and result.startswith("Error"))
+        return result
+    except Exception:
+        ok = False
+        return None
+    finally:
+        recorder.record(stage, time.perf_counter() - started, ok)
+
+
+def run_session(session_idx, args, recorder):
+    from services.gemini_llm import (
+        answer_question_with_rag,
+        build_rag_index,
+        generate_infographic_image,
+        generate_podcast_script,
+    )
+    from services.google_tts import iter_audio_segments, join_audio_segments
+    from services.usage_ledger import usage_context
+    from utils.artifact_store import get_artifact_store
+    from utils.pdf_processor import extract_text_from_pdf
+
+    store = get_artifact_store()
+    session_id = f"load-{session_idx}"
+    api_key = f"load-test-key-{session_idx}"
+
+    with usage_context(session_id=session_id):
+        pdf_text = _timed(recorder, "upload", extract_text_from_pdf, BytesIO(_synthetic_document(args.pages, session_idx)))
+        store.put(session_id, "pdf_text", pdf_text)
+
+        script = _timed(recorder, "script", generate_podcast_script, pdf_text, api_key)
+        image = _timed(recorder, "infographic", generate_infographic_image, pdf_text, api_key)
+        store.put(session_id, "infographic_image", image if isinstance(image, bytes) else None)
+
+        audio = _timed(recorder, "audio", lambda: join_audio_segments(list(iter_audio_segments(script or ""))))
+        store.put(session_id, "audio_file", audio, prefer_disk=True, extension="mp3")
+
+        rag_index = _timed(recorder, "index", build_rag_index, pdf_text, api_key)
+        store.put(session_id, "rag_index", rag_index)
+
+        rng = random.Random(session_idx)
+        for _ in range(args.questions):
+            question = "what does the paper say about " + " ".join(rng.choices(WORDS, k=3))
+            _timed(recorder, "chat", answer_question_with_rag, question, rag_index, api_key)
+
+    store.drop_session(session_id)
+
+
+# --- Reporte ---
+
+def _percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="sesiones concurrentes")
+    parser.add_argument("--sessions", type=int, default=30, help="sesiones totales")
+    parser.add_argument("--questions", type=int, default=5, help="preguntas por sesion")
+    parser.add_argument("--pages", type=int, default=12, help="paginas del PDF sintetico")
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--image-latency", type=float, default=3.0)
+    parser.add_argument("--tts-latency", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    install_local_backends(args.llm_latency, args.embed_latency, args.image_latency, args.tts_latency)
+    # Los registros de uso sinteticos van a un ledger temporal, nunca al real.
+    ledger_dir = tempfile.mkdtemp(prefix="paper-to-podcast-load-")
+    os.environ["PAPER_TO_PODCAST_LEDGER_PATH"] = os.path.join(ledger_dir, "usage_ledger.sqlite3")
+    recorder = _Recorder()
+
+    peak_threads = [threading.active_count()]
+    stop_sampling = threading.Event()
+
+    def sample_threads():
+        while not stop_sampling.wait(0.05):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users, thread_name_prefix="session") as pool:
+        list(pool.map(lambda idx: run_session(idx, args, recorder), range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    stop_sampling.set()
+    sampler.join()
+
+    from services.gemini_llm import get_retrieval_latency_stats
+    from services.rate_limiter import get_rate_limiter
+    from services.usage_ledger import get_usage_ledger
+
+    total_questions = len(recorder.samples["chat"])
+    print(f"{args.sessions} sesiones ({args.users} concurrentes) en {elapsed:.1f} s")
+    print(f"Throughput: {args.sessions / elapsed:.2f} sesiones/s, {total_questions / elapsed:.2f} preguntas/s")
+    print(f"{'etapa':<12} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    for stage in STAGES:
+        samples = recorder.samples[stage]
+        print(
+            f"{stage:<12} {len(samples):>5} {_percentile(samples, 0.50) * 1000:>9.0f} "
+            f"{_percentile(samples, 0.95) * 1000:>9.0f} {_percentile(samples, 0.99) * 1000:>9.0f} "
+            f"{recorder.errors[stage]:>8}"
+        )
+
+    retrieval = get_retrieval_latency_stats()
+    print(f"Retrieval: p50 {retrieval['p50_ms']:.0f} ms, p99 {retrieval['p99_ms']:.0f} ms")
+    max_wait = max([m["wait_max_seconds"] for m in get_rate_limiter().metrics().values()] or [0.0])
+    print(f"Espera maxima en el limitador: {max_wait:.2f} s")
+    # En Linux ru_maxrss esta en KB.
+    print(f"RSS maximo: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    print(f"Hilos maximos: {peak_threads[0]}")
+    print("Tokens estimados por etapa (entrada/salida):")
+    for row in get_usage_ledger().summary(group_by="stage"):
+        print(f"  {row['stage']:<16} {row['input_tokens']:>12,} {row['output_tokens']:>10,}")
+    shutil.rmtree(ledger_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
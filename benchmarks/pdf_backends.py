@@ -0,0 +1,44 @@
+"""
+Benchmark de backends de extraccion de PDF.
+
+Compara paginas por segundo y texto extraido de cada backend instalado
+(pypdfium2, PyPDF2, pdfminer.six) sobre un corpus local de PDFs.
+
+Uso:
+    python -m benchmarks.pdf_backends carpeta_con_pdfs/ [otro.pdf ...]
+"""
+import os
+import sys
+
+from utils.pdf_processor import available_backends, benchmark_backends
+
+
+def _collect_pdfs(paths):
+    pdf_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                pdf_paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(".pdf"))
+        elif path.lower().endswith(".pdf"):
+            pdf_paths.append(path)
+    return pdf_paths
+
+
+def main(argv=None):
+    pdf_paths = _collect_pdfs(argv if argv is not None else sys.argv[1:])
+    if not pdf_paths:
+        print(__doc__)
+        return 1
+
+    print(f"{len(pdf_paths)} PDFs; backends instalados: {', '.join(available_backends()) or 'ninguno'}")
+    print(f"{'backend':<10} {'paginas':>8} {'pag/s':>9} {'caracteres':>12} {'vacias':>7} {'fallos':>7}")
+    for name, stats in benchmark_backends(pdf_paths).items():
+        print(
+            f"{name:<10} {stats['pages']:>8} {stats['pages_per_second']:>9.1f} "
+            f"{stats['chars']:>12,} {stats['empty_pages']:>7} {stats['failures']:>7}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
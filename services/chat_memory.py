@@ -0,0 +1,163 @@
+"""
+Memoria acotada para el chat RAG.
+
+Se guardan los ultimos turnos tal cual; los anteriores se compactan localmente (sin llamar
+a Gemini) en un resumen con tamano maximo. Asi el prompt y la memoria por sesion no crecen
+con la longitud de la conversacion.
+
+Las preguntas de seguimiento ("y el segundo?", "what about that one?") se reescriben
+localmente antes del retrieval con los terminos del turno anterior.
+"""
+import re
+from collections import deque
+
+RECENT_TURNS = 3
+MAX_QUESTION_CHARS = 300
+MAX_ANSWER_CHARS = 600
+SUMMARY_LINE_CHARS = 200
+SUMMARY_MAX_CHARS = 1500
+FOLLOW_UP_MAX_WORDS = 8
+CONTEXT_TERMS = 8
+
+# Solo pronombres y referencias explicitas: los determinantes ("este modelo", "this paper") y
+# las formas sin tilde que coinciden con verbos ("esta" / "está") aparecen en preguntas autonomas.
+FOLLOW_UP_MARKERS = {
+    # Espanol
+    "eso", "esto", "ello", "ellos", "ellas", "éste", "ésta", "ése", "ésa", "dicho", "dicha", "anterior",
+    # Ingles
+    "it", "its", "they", "them", "their", "previous", "former", "latter", "above",
+}
+FOLLOW_UP_OPENERS = ("y ", "¿y ", "and ", "what about", "how about", "que hay de", "qué hay de", "tambien", "también")
+ORDINALS = {
+    "primer": 1, "primero": 1, "primera": 1, "first": 1, "1st": 1,
+    "segundo": 2, "segunda": 2, "second": 2, "2nd": 2,
+    "tercer": 3, "tercero": 3, "tercera": 3, "third": 3, "3rd": 3,
+    "cuarto": 4, "cuarta": 4, "fourth": 4, "4th": 4,
+    "quinto": 5, "quinta": 5, "fifth": 5, "5th": 5,
+    "ultimo": -1, "último": -1, "ultima": -1, "última": -1, "last": -1,
+}
+# Un ordinal es una referencia si va solo ("el segundo?") o seguido de estas palabras
+# ("the second one", "el tercero de la lista"); seguido de un sustantivo ("the first author") no lo es.
+ORDINAL_REFERENCE_FOLLOWERS = {"one", "ones", "of", "uno", "una", "de", "item", "point", "punto", "option", "opcion", "opción"}
+STOPWORDS = {
+    "el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del", "al", "que", "y", "o", "en",
+    "para", "con", "por", "como", "se", "su", "sus", "es", "son", "fue", "lo", "le", "mas", "más",
+    "pdf", "documento", "paper", "fuentes", "sobre", "cual", "cuál", "cuales", "cuáles", "qué", "dice",
+    "the", "a", "an", "of", "to", "in", "on", "for", "with", "by", "and", "or", "is", "are", "was",
+    "were", "what", "which", "how", "does", "do", "did", "about", "sources", "say", "says", "document",
+    "este", "esta", "estos", "estas", "ese", "esa", "this", "that", "these", "those",
+}
+
+_ENUMERATED_LINE = re.compile(r"^\s*(?:\d{1,2}[.)]|[-*•])\s+(.*\S)")
+_SOURCES = re.compile(r"\b(?:Fuentes|Sources):.*$", re.IGNORECASE | re.MULTILINE)
+
+
+def _clip(text, limit):
+    text = re.sub(r"\s+", " ", (text or "").strip())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def _words(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def _ordinal_reference(question):
+    """Posicion a la que se refiere la pregunta ("the second one" -> 2, "el ultimo" -> -1) o None."""
+    words = _words(question)
+    for idx, word in enumerate(words):
+        if word in ORDINALS and (idx + 1 == len(words) or words[idx + 1] in ORDINAL_REFERENCE_FOLLOWERS):
+            return ORDINALS[word]
+    return None
+
+
+def _first_sentence(text):
+    text = _SOURCES.sub("", text or "").strip()
+    match = re.search(r"(.+?[.!?])(\s|$)", text, re.DOTALL)
+    return match.group(1) if match else text
+
+
+class ChatMemory:
+    def __init__(self, recent_turns=RECENT_TURNS, summary_max_chars=SUMMARY_MAX_CHARS):
+        self._recent = deque(maxlen=recent_turns)
+        self._summary_lines = deque()
+        self._summary_max_chars = summary_max_chars
+        self.compacted_turns = 0
+
+    def __len__(self):
+        return self.compacted_turns + len(self._recent)
+
+    def add_turn(self, question, answer):
+        """Guarda un turno; el mas antiguo de los recientes pasa al resumen."""
+        if len(self._recent) == self._recent.maxlen:
+            self._compact(*self._recent[0])
+        self._recent.append((_clip(question, MAX_QUESTION_CHARS), _clip(answer, MAX_ANSWER_CHARS)))
+
+    def _compact(self, question, answer):
+        self._summary_lines.append(_clip(f"- {question} -> {_first_sentence(answer)}", SUMMARY_LINE_CHARS))
+        self.compacted_turns += 1
+        # El resumen es una ventana: se descartan las lineas mas antiguas al pasar el limite.
+        while sum(len(line) + 1 for line in self._summary_lines) > self._summary_max_chars:
+            self._summary_lines.popleft()
+
+    def summary(self):
+        return "\n".join(self._summary_lines)
+
+    def to_prompt(self):
+        """Bloque de conversacion para el prompt (resumen + ultimos turnos). Vacio si no hay historia."""
+        parts = []
+        if self._summary_lines:
+            parts.append(f"Earlier turns (summary):\n{self.summary()}")
+        for question, answer in self._recent:
+            parts.append(f"User: {question}\nAssistant: {answer}")
+        return "\n\n".join(parts)
+
+    def is_follow_up(self, question):
+        if not self._recent:
+            return False
+        lowered = (question or "").strip().lower()
+        words = _words(lowered)
+        if lowered.startswith(FOLLOW_UP_OPENERS) or _ordinal_reference(lowered) is not None:
+            return True
+        return len(words) <= FOLLOW_UP_MAX_WORDS and any(word in FOLLOW_UP_MARKERS for word in words)
+
+    def _ordinal_item(self, question):
+        """Si la pregunta se refiere a "el segundo"/"the last", retorna ese elemento de la ultima lista."""
+        ordinal = _ordinal_reference(question)
+        if ordinal is None:
+            return None
+        for _, answer in reversed(self._recent):
+            # Las respuestas se guardan en una linea; las listas se separan de nuevo por sus marcadores.
+            items = [
+                match.group(1)
+                for line in re.split(r"\s(?=(?:\d{1,2}[.)]|[-*•])\s)", _SOURCES.sub("", answer))
+                for match in [_ENUMERATED_LINE.match(line)]
+                if match
+            ]
+            if items:
+                index = ordinal - 1 if ordinal > 0 else len(items) - 1
+                return items[index] if index < len(items) else None
+        return None
+
+    def _context_terms(self):
+        question, answer = self._recent[-1]
+        terms = []
+        for word in _words(question) + _words(_SOURCES.sub("", answer)):
+            if word in STOPWORDS or word in FOLLOW_UP_MARKERS or len(word) < 3 or word.isdigit():
+                continue
+            if word not in terms:
+                terms.append(word)
+            if len(terms) == CONTEXT_TERMS:
+                break
+        return terms
+
+    def rewrite_query(self, question):
+        """
+        Consulta de retrieval para `question`. Las preguntas autonomas no cambian; los
+        seguimientos se completan con el elemento al que se refieren o con los terminos del turno anterior.
+        """
+        if not self.is_follow_up(question):
+            return question
+        item = self._ordinal_item(question)
+        if item:
+            return f"{question} {_clip(item, MAX_QUESTION_CHARS)}"
+        return f"{question} {' '.join(self._context_terms())}".strip()
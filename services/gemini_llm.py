@@ -1,22 +1,38 @@
 import base64
 import json
 import math
+import contextvars
 import re
-
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
-
-try:
-    from google import genai as google_genai
-    from google.genai import types
-except Exception:
-    google_genai = None
-    types = None
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from services.rate_limiter import (
+    PRIORITY_BATCH,
+    PRIORITY_DEFAULT,
+    PRIORITY_INTERACTIVE,
+    estimate_tokens,
+    get_rate_limiter,
+)
+from services.usage_ledger import record_usage
+# Los SDKs de Google se importan en el primer uso (ver utils.backends).
+from utils.backends import get_backend
+from utils.text_dedup import dedup_chunks, strip_repeated_page_lines
+
+# Contexto maximo (caracteres, ~3k tokens) para el guion y la infografia en documentos largos.
+SALIENT_CONTEXT_CHARS = 12000
+
+# Las llamadas de retrieval (traduccion y embeddings de consulta) se lanzan en paralelo
+# y cada pregunta tiene un plazo maximo; lo que no llegue a tiempo se descarta.
+RETRIEVAL_DEADLINE_SECONDS = 8.0
+_retrieval_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+_retrieval_latencies = deque(maxlen=1000)
+_retrieval_latencies_lock = threading.Lock()
 
 
 def configure_gemini(api_key):
+    genai = get_backend("google.generativeai")
     try:
         if genai is None:
             return False
@@ -28,8 +44,30 @@ def configure_gemini(api_key):
         return False
 
 
-def generate_podcast_script(text_content, api_key):
+def _rate_limited(api_key, model_name, prompt, priority=PRIORITY_DEFAULT, deadline=None):
+    """
+    Espera cupo en el limitador compartido antes de llamar a `model_name`.
+    Con `deadline` (time.monotonic), deja de esperar cuando vence en vez de gastar cupo tarde.
+    """
+    limits = {}
+    if deadline is not None:
+        limits["timeout"] = max(0.0, deadline - time.monotonic())
+    return get_rate_limiter().limit(
+        api_key,
+        model_name,
+        tokens=estimate_tokens(prompt),
+        priority=priority,
+        **limits,
+    )
+
+
+def _expired(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def generate_podcast_script(text_content, api_key, rag_index=None):
     """Usa Gemini Pro para convertir texto tecnico en un dialogo."""
+    genai = get_backend("google.generativeai")
     if genai is None:
         return "Error en Gemini: falta dependencia 'google-generativeai'. Ejecuta: pip install -r requirements.txt"
 
@@ -38,6 +76,9 @@ def generate_podcast_script(text_content, api_key):
 
     model = genai.GenerativeModel("gemini-3-flash-preview")
 
+    # Limitamos caracteres eligiendo los fragmentos mas representativos de todo el documento.
+    context = _select_salient_context(text_content, rag_index=rag_index)
+
     prompt = f"""
     Eres un guionista de podcasts experto y creativo.
 
@@ -54,11 +95,13 @@ def generate_podcast_script(text_content, api_key):
     4. Formato de salida: Solo el texto del dialogo. No uses acotaciones de sonido como [Musica] o [Aplausos].
 
     TEXTO ORIGINAL:
-    {text_content[:30000]}  # Limitamos caracteres por seguridad
+    {context}
     """
 
     try:
-        response = model.generate_content(prompt)
+        with _rate_limited(api_key, "gemini-3-flash-preview", prompt):
+            response = model.generate_content(prompt)
+        record_usage("script", "gemini-3-flash-preview", prompt, response, output_text=response.text)
         return response.text
     except Exception as e:
         return f"Error en Gemini: {e}"
@@ -87,6 +130,110 @@ def _chunk_text(text_content, chunk_size_words=220, overlap_words=40):
     return chunks
 
 
+def _term_weights(chunks):
+    """Vectores TF-IDF dispersos (dict termino -> peso) para cada chunk."""
+    term_counts = []
+    document_frequency = {}
+    for chunk in chunks:
+        counts = {}
+        for token in re.findall(r"\w+", chunk.lower()):
+            if len(token) > 2 and not token.isdigit():
+                counts[token] = counts.get(token, 0) + 1
+        term_counts.append(counts)
+        for token in counts:
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+
+    total = len(chunks)
+    vectors = []
+    for counts in term_counts:
+        vectors.append({
+            token: (1 + math.log(count)) * math.log(1 + total / document_frequency[token])
+            for token, count in counts.items()
+        })
+    return vectors
+
+
+def _sparse_cosine(vec_a, vec_b):
+    if not vec_a or not vec_b:
+        return 0.0
+    if len(vec_a) > len(vec_b):
+        vec_a, vec_b = vec_b, vec_a
+    dot = sum(weight * vec_b.get(token, 0.0) for token, weight in vec_a.items())
+    norm_a = math.sqrt(sum(weight * weight for weight in vec_a.values()))
+    norm_b = math.sqrt(sum(weight * weight for weight in vec_b.values()))
+    if norm_a == 0 or norm_b == 0:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+def _overlap_words(previous, chunk, max_words=60):
+    """Palabras al inicio de `chunk` que repiten el final de `previous` (chunks con solapamiento)."""
+    previous_words = previous.split(" ")
+    words = chunk.split(" ")
+    for size in range(min(max_words, len(previous_words), len(words) - 1), 0, -1):
+        if previous_words[-size:] == words[:size]:
+            return size
+    return 0
+
+
+def _select_salient_context(text_content, rag_index=None, char_budget=SALIENT_CONTEXT_CHARS):
+    """
+    Selecciona los chunks mas representativos del documento hasta llenar `char_budget`.
+    La centralidad es la similitud de cada chunk con el centroide del documento: se usan los
+    embeddings del indice RAG si existen y, si no, vectores TF-IDF. El resultado respeta el orden original.
+    Si dos chunks consecutivos entran, el texto que comparten solo se incluye una vez.
+    """
+    text_content = text_content or ""
+    if len(text_content) <= char_budget:
+        return text_content
+
+    if (rag_index or {}).get("retrieval_mode") == "semantic" and rag_index.get("embeddings"):
+        chunks = list(rag_index["chunks"])
+        vectors = rag_index["embeddings"]
+        size = min(len(vector) for vector in vectors)
+        centroid = [sum(float(vector[idx]) for vector in vectors) / len(vectors) for idx in range(size)]
+        scores = [_cosine_similarity(vector, centroid) for vector in vectors]
+    else:
+        chunks = _chunk_text(text_content, overlap_words=0)
+        vectors = _term_weights(chunks)
+        centroid = {}
+        for vector in vectors:
+            for token, weight in vector.items():
+                centroid[token] = centroid.get(token, 0.0) + weight
+        scores = [_sparse_cosine(vector, centroid) for vector in vectors]
+
+    if not chunks:
+        return text_content[:char_budget]
+
+    # Parte de cada chunk que no repite al anterior; se usa cuando el anterior tambien entra.
+    novel = [chunks[0]] + [
+        " ".join(chunks[idx].split(" ")[_overlap_words(chunks[idx - 1], chunks[idx]):])
+        for idx in range(1, len(chunks))
+    ]
+
+    # El primer chunk (titulo, resumen) siempre entra: suele ser el mejor punto de partida.
+    ranked = [0] + sorted(range(1, len(chunks)), key=lambda idx: scores[idx], reverse=True)
+    selected = set()
+    used = 0
+    for idx in ranked:
+        cost = len(novel[idx] if idx - 1 in selected else chunks[idx]) + 2
+        # Si el siguiente ya entro completo, ahora solo necesita su parte nueva.
+        refund = len(chunks[idx + 1]) - len(novel[idx + 1]) if idx + 1 in selected else 0
+        if used + cost - refund > char_budget:
+            continue
+        selected.add(idx)
+        used += cost - refund
+
+    # Los chunks consecutivos continuan el mismo pasaje; los saltos se separan con una linea en blanco.
+    parts = []
+    for idx in sorted(selected):
+        if idx - 1 in selected:
+            parts[-1] += " " + novel[idx]
+        else:
+            parts.append(chunks[idx])
+    return "\n\n".join(parts)
+
+
 def _parse_embedding_response(response):
     """Extrae un vector de embedding de respuestas con distintos formatos."""
     if response is None:
@@ -163,20 +310,13 @@ def _looks_like_spanish(text):
     return hits >= 2
 
 
-def _build_query_variants(question, api_key):
-    """
-    Crea variantes bilingues de la pregunta para mejorar retrieval lexical.
-    Si Gemini no esta disponible, retorna solo la pregunta original.
-    """
-    clean_question = (question or "").strip()
-    if not clean_question:
-        return []
-
-    variants = [clean_question]
-    if genai is None or not configure_gemini(api_key):
-        return variants
+def _translate_question(question, api_key, deadline=None):
+    """Traduce la pregunta al otro idioma (ES <-> EN). Retorna None si no es posible."""
+    genai = get_backend("google.generativeai")
+    if genai is None or _expired(deadline) or not configure_gemini(api_key):
+        return None
 
-    source_lang = "Spanish" if _looks_like_spanish(clean_question) else "English"
+    source_lang = "Spanish" if _looks_like_spanish(question) else "English"
     target_lang = "English" if source_lang == "Spanish" else "Spanish"
 
     prompt = f"""
@@ -184,19 +324,18 @@ Translate the following user question to {target_lang}.
 Return only the translated question, with no explanations.
 
 Question:
-{clean_question}
+{question}
 """
 
     try:
         model = genai.GenerativeModel("gemini-3-flash-preview")
-        response = model.generate_content(prompt)
+        with _rate_limited(api_key, "gemini-3-flash-preview", prompt, PRIORITY_INTERACTIVE, deadline):
+            response = model.generate_content(prompt)
         translated = (getattr(response, "text", "") or "").strip()
-        if translated:
-            variants.append(translated)
+        record_usage("translation", "gemini-3-flash-preview", prompt, response, output_text=translated)
+        return translated or None
     except Exception:
-        pass
-
-    return variants
+        return None
 
 
 def _not_found_message(question):
@@ -207,23 +346,29 @@ def build_rag_index(text_content, api_key):
     """
     Crea un indice RAG en memoria.
     Retorna un dict con chunks + embeddings (si estan disponibles).
+    Antes de embeber se quitan cabeceras/pies repetidos y chunks casi duplicados.
     """
-    chunks = _chunk_text(text_content)
+    genai = get_backend("google.generativeai")
+    clean_text, header_lines_removed = strip_repeated_page_lines(text_content)
+    chunks, dedup_stats = dedup_chunks(_chunk_text(clean_text))
+    dedup_stats["header_lines_removed"] = header_lines_removed
     if not chunks:
-        return {"chunks": [], "embeddings": [], "retrieval_mode": "lexical"}
+        return {"chunks": [], "embeddings": [], "retrieval_mode": "lexical", "dedup": dedup_stats}
 
     # Si falla configuracion o embeddings, dejamos fallback lexical.
     if genai is None or not configure_gemini(api_key):
-        return {"chunks": chunks, "embeddings": [], "retrieval_mode": "lexical"}
+        return {"chunks": chunks, "embeddings": [], "retrieval_mode": "lexical", "dedup": dedup_stats}
 
     embeddings = []
     for chunk in chunks:
         try:
-            response = genai.embed_content(
-                model="models/text-embedding-004",
-                content=chunk,
-                task_type="retrieval_document",
-            )
+            with _rate_limited(api_key, "models/text-embedding-004", chunk, PRIORITY_BATCH):
+                response = genai.embed_content(
+                    model="models/text-embedding-004",
+                    content=chunk,
+                    task_type="retrieval_document",
+                )
+            record_usage("index_embedding", "models/text-embedding-004", chunk, response)
             vector = _parse_embedding_response(response)
             if vector is None:
                 embeddings = []
@@ -241,36 +386,136 @@ def build_rag_index(text_content, api_key):
         "chunks": chunks,
         "embeddings": embeddings,
         "retrieval_mode": retrieval_mode,
+        "dedup": dedup_stats,
     }
 
 
-def _retrieve_top_chunks(question, rag_index, api_key, top_k=4):
+def _embed_query(query, api_key, deadline=None):
+    """Calcula el embedding de consulta de un texto. Retorna None si falla o vence `deadline`."""
+    genai = get_backend("google.generativeai")
+    if genai is None or _expired(deadline) or not configure_gemini(api_key):
+        return None
+    with _rate_limited(api_key, "models/text-embedding-004", query, PRIORITY_INTERACTIVE, deadline):
+        query_response = genai.embed_content(
+            model="models/text-embedding-004",
+            content=query,
+            task_type="retrieval_query",
+        )
+    record_usage("query_embedding", "models/text-embedding-004", query, query_response)
+    return _parse_embedding_response(query_response)
+
+
+def _translate_and_embed(question, api_key, semantic, deadline=None):
+    translated = _translate_question(question, api_key, deadline)
+    if not translated or not semantic:
+        return translated, None
+    return translated, _embed_query(translated, api_key, deadline)
+
+
+def _gather_query_signals(question, api_key, semantic, deadline_seconds=None):
+    """
+    Lanza en paralelo el embedding de la pregunta y la traduccion (+ su embedding).
+    Al vencer el plazo usa lo que ya este listo: las tareas en cola se cancelan y las que
+    siguen esperando cupo en el limitador se rinden, para no ocupar el pool ni gastar cuota.
+    Retorna (variantes, vectores_de_consulta).
+    """
+    clean_question = (question or "").strip()
+    variants = [clean_question] if clean_question else []
+    if not clean_question:
+        return variants, []
+
+    timeout = RETRIEVAL_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+    deadline = time.monotonic() + timeout
+
+    # Cada tarea hereda el contexto (sesion/documento) para el ledger de uso.
+    original_future = None
+    if semantic:
+        original_future = _retrieval_pool.submit(
+            contextvars.copy_context().run, _embed_query, clean_question, api_key, deadline,
+        )
+    translated_future = _retrieval_pool.submit(
+        contextvars.copy_context().run, _translate_and_embed, clean_question, api_key, semantic, deadline,
+    )
+    pending = [future for future in (original_future, translated_future) if future is not None]
+    wait(pending, timeout=timeout)
+    for future in pending:
+        future.cancel()
+
+    query_vectors = []
+    original_vector = _finished_result(original_future)
+    if original_vector:
+        query_vectors.append(original_vector)
+    translated, translated_vector = _finished_result(translated_future) or (None, None)
+    if translated:
+        variants.append(translated)
+    if translated_vector:
+        query_vectors.append(translated_vector)
+    return variants, query_vectors
+
+
+def _finished_result(future):
+    """Resultado de una tarea terminada a tiempo; None si sigue en curso, se cancelo o fallo."""
+    if future is None or not future.done() or future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
+
+
+def _retrieve_from_vector_store(query_vectors, vector_store, top_k=4, doc_ids=None, where=None):
+    """Busca en la biblioteca persistente (services.vector_store) sobre un subconjunto de documentos."""
+    try:
+        results = vector_store.search(query_vectors, top_k=top_k, doc_ids=doc_ids, where=where, min_score=0.15)
+        return [result["chunk"] for result in results]
+    except Exception:
+        return []
+
+
+def get_retrieval_latency_stats():
+    """Latencias recientes de `_retrieve_top_chunks` (p50/p99 en milisegundos)."""
+    with _retrieval_latencies_lock:
+        samples = sorted(_retrieval_latencies)
+    if not samples:
+        return {"count": 0, "p50_ms": 0.0, "p99_ms": 0.0}
+    return {
+        "count": len(samples),
+        "p50_ms": samples[len(samples) // 2] * 1000.0,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000.0,
+    }
+
+
+def _retrieve_top_chunks(question, rag_index, api_key, top_k=4, vector_store=None, doc_ids=None, where=None):
+    started = time.perf_counter()
+    try:
+        return _retrieve_top_chunks_within_deadline(
+            question, rag_index, api_key, top_k=top_k, vector_store=vector_store, doc_ids=doc_ids, where=where,
+        )
+    finally:
+        with _retrieval_latencies_lock:
+            _retrieval_latencies.append(time.perf_counter() - started)
+
+
+def _retrieve_top_chunks_within_deadline(question, rag_index, api_key, top_k=4, vector_store=None, doc_ids=None, where=None):
+    if vector_store is not None:
+        _, query_vectors = _gather_query_signals(question, api_key, semantic=True)
+        if not query_vectors:
+            return []
+        return _retrieve_from_vector_store(query_vectors, vector_store, top_k=top_k, doc_ids=doc_ids, where=where)
+
     chunks = (rag_index or {}).get("chunks", [])
     if not chunks:
         return []
 
-    question_variants = _build_query_variants(question, api_key)
+    retrieval_mode = (rag_index or {}).get("retrieval_mode", "lexical")
+    question_variants, query_vectors = _gather_query_signals(
+        question,
+        api_key,
+        semantic=retrieval_mode == "semantic",
+    )
     if not question_variants:
         question_variants = [question]
 
-    retrieval_mode = (rag_index or {}).get("retrieval_mode", "lexical")
-    if retrieval_mode == "semantic":
+    # Si ningun embedding de consulta llego a tiempo, degradamos a scoring lexical.
+    if retrieval_mode == "semantic" and query_vectors:
         try:
-            configure_gemini(api_key)
-            query_vectors = []
-            for query in question_variants:
-                query_response = genai.embed_content(
-                    model="models/text-embedding-004",
-                    content=query,
-                    task_type="retrieval_query",
-                )
-                query_vector = _parse_embedding_response(query_response)
-                if query_vector:
-                    query_vectors.append(query_vector)
-
-            if not query_vectors:
-                return []
-
             scored = []
             for idx, chunk_vector in enumerate((rag_index or {}).get("embeddings", [])):
                 best_score = -1.0
@@ -296,15 +541,37 @@ def _retrieve_top_chunks(question, rag_index, api_key, top_k=4):
     return [chunks[idx] for idx in selected_idx]
 
 
-def answer_question_with_rag(question, rag_index, api_key):
-    """Responde preguntas usando solo contexto recuperado del PDF."""
+def add_rag_index_to_store(vector_store, doc_id, rag_index, metadata=None):
+    """Guarda un indice semantico de `build_rag_index` en la biblioteca persistente."""
+    if (rag_index or {}).get("retrieval_mode") != "semantic":
+        return False
+    return vector_store.add_document(doc_id, rag_index["chunks"], rag_index["embeddings"], metadata=metadata)
+
+
+def answer_question_with_rag(question, rag_index, api_key, vector_store=None, doc_ids=None, where=None, history=None):
+    """
+    Responde preguntas usando solo contexto recuperado del PDF.
+    Con `vector_store`, busca en la biblioteca (opcionalmente filtrada por `doc_ids`/`where`).
+    Con `history` (services.chat_memory.ChatMemory), las preguntas de seguimiento se reescriben
+    para el retrieval y la conversacion acotada se incluye en el prompt.
+    """
+    genai = get_backend("google.generativeai")
     if genai is None:
         return "Error en Gemini: falta dependencia 'google-generativeai'. Ejecuta: pip install -r requirements.txt"
 
     if not configure_gemini(api_key):
         return "Error en Gemini: API key invalida o vacia."
 
-    top_chunks = _retrieve_top_chunks(question, rag_index, api_key=api_key, top_k=4)
+    retrieval_query = history.rewrite_query(question) if history is not None else question
+    top_chunks = _retrieve_top_chunks(
+        retrieval_query,
+        rag_index,
+        api_key=api_key,
+        top_k=4,
+        vector_store=vector_store,
+        doc_ids=doc_ids,
+        where=where,
+    )
     if not top_chunks:
         return _not_found_message(question)
 
@@ -313,6 +580,14 @@ def answer_question_with_rag(question, rag_index, api_key):
         context_blocks.append(f"[C{idx}] {chunk[:1700]}")
     context = "\n\n".join(context_blocks)
 
+    conversation = history.to_prompt() if history is not None else ""
+    conversation_block = ""
+    if conversation:
+        conversation_block = f"""
+CONVERSATION SO FAR (use it only to resolve references such as "it" or "the second one"):
+{conversation}
+"""
+
     prompt = f"""
 You are a question-answering assistant over a PDF.
 
@@ -330,15 +605,17 @@ Strict rules:
 
 USER QUESTION:
 {question}
-
+{conversation_block}
 CONTEXT:
 {context}
 """
 
     try:
         model = genai.GenerativeModel("gemini-3-flash-preview")
-        response = model.generate_content(prompt)
+        with _rate_limited(api_key, "gemini-3-flash-preview", prompt, PRIORITY_INTERACTIVE):
+            response = model.generate_content(prompt)
         answer = getattr(response, "text", "") or _extract_text_from_response(response)
+        record_usage("answer", "gemini-3-flash-preview", prompt, response, output_text=answer)
         return answer.strip() if answer else _not_found_message(question)
     except Exception as e:
         return f"Error en Gemini: {e}"
@@ -495,7 +772,8 @@ def _normalize_infographic_outline(raw_outline):
     }
 
 
-def _build_outline_prompt(text_content):
+def _build_outline_prompt(text_content, rag_index=None):
+    context = _select_salient_context(text_content, rag_index=rag_index)
     return f"""
 Eres editor senior de contenido y especialista en sintetizar documentos tecnicos.
 
@@ -520,13 +798,13 @@ Reglas:
 - Cada "detail" debe ser breve (maximo 20 palabras).
 
 CONTENIDO DEL PDF:
-{text_content[:30000]}
+{context}
 """
 
 
-def _generate_infographic_outline(client, text_content):
+def _generate_infographic_outline(client, text_content, api_key=None, rag_index=None):
     """Genera un esquema textual coherente para la infografia."""
-    prompt = _build_outline_prompt(text_content)
+    prompt = _build_outline_prompt(text_content, rag_index=rag_index)
     outline_models = [
         "gemini-2.5-pro",
         "gemini-2.5-flash",
@@ -536,11 +814,13 @@ def _generate_infographic_outline(client, text_content):
 
     for model_name in outline_models:
         try:
-            response = client.models.generate_content(
-                model=model_name,
-                contents=[prompt],
-            )
+            with _rate_limited(api_key, model_name, prompt):
+                response = client.models.generate_content(
+                    model=model_name,
+                    contents=[prompt],
+                )
             raw_text = _extract_text_from_response(response)
+            record_usage("outline", model_name, prompt, response, output_text=raw_text)
             raw_outline = _extract_json_object(raw_text)
             normalized = _normalize_infographic_outline(raw_outline)
             if normalized:
@@ -552,6 +832,70 @@ def _generate_infographic_outline(client, text_content):
     return f"No fue posible crear el esquema textual de la infografia. Detalle: {' | '.join(errors)}"
 
 
+def _build_fused_prompt(text_content, rag_index=None):
+    context = _select_salient_context(text_content, rag_index=rag_index)
+    return f"""
+Eres guionista de podcasts y editor senior especialista en sintetizar documentos tecnicos.
+
+Con el CONTENIDO DEL PDF produce, en ESPANOL, dos cosas a la vez y entregalas en un unico JSON valido
+(sin markdown, sin texto extra) con este formato exacto:
+{{
+  "script": "guion completo del podcast",
+  "outline": {{
+    "title": "string corto",
+    "subtitle": "string corto",
+    "key_points": [
+      {{"heading": "string corto", "detail": "string corto"}}
+    ],
+    "conclusion": "string corto"
+  }}
+}}
+
+Reglas para "script":
+- Dialogo atractivo entre dos personas: Alex (Curioso) y Sam (Experto).
+- Tono conversacional, educativo, dinamico y minimalista.
+- Estructura: breve intro, discusion de los 3 puntos mas importantes del texto, conclusion rapida.
+- Solo el texto del dialogo, con un turno por linea. No uses acotaciones como [Musica] o [Aplausos].
+
+Reglas para "outline" (esquema de infografia):
+- key_points debe tener entre 4 y 6 elementos.
+- Texto claro, factual y coherente. No inventes informacion.
+- Cada "detail" debe ser breve (maximo 20 palabras).
+
+CONTENIDO DEL PDF:
+{context}
+"""
+
+
+def generate_script_and_outline(text_content, api_key, rag_index=None):
+    """
+    Modo combinado: pide guion y esquema de infografia en una sola llamada.
+    Si la respuesta no valida, vuelve a `generate_podcast_script` (y el esquema se
+    generara por separado en `generate_infographic_image`).
+    Retorna (guion, esquema_o_None).
+    """
+    genai = get_backend("google.generativeai")
+    if genai is not None and configure_gemini(api_key):
+        prompt = _build_fused_prompt(text_content, rag_index=rag_index)
+        try:
+            model = genai.GenerativeModel("gemini-3-flash-preview")
+            with _rate_limited(api_key, "gemini-3-flash-preview", prompt):
+                response = model.generate_content(
+                    prompt,
+                    generation_config={"response_mime_type": "application/json"},
+                )
+            raw_text = _extract_text_from_response(response)
+            record_usage("script_outline", "gemini-3-flash-preview", prompt, response, output_text=raw_text)
+            raw = _extract_json_object(raw_text) or {}
+            script = raw.get("script")
+            if isinstance(script, str) and script.strip():
+                return script.strip(), _normalize_infographic_outline(raw.get("outline"))
+        except Exception:
+            pass
+
+    return generate_podcast_script(text_content, api_key, rag_index=rag_index), None
+
+
 def _build_image_prompt_from_outline(outline):
     """Crea un prompt visual a partir del esquema (texto ya curado)."""
     sections = []
@@ -581,21 +925,25 @@ Output requirements:
 """
 
 
-def generate_infographic_image(text_content, api_key):
+def generate_infographic_image(text_content, api_key, rag_index=None, outline=None):
     """
     Genera una infografia en PNG a partir del contenido del PDF.
+    Si se pasa `outline` (p. ej. del modo combinado), no se vuelve a generar el esquema.
     Retorna:
     - bytes de imagen (ok)
     - str con mensaje de error (fallo)
     """
     if not api_key:
         return "Error en Imagen: API key vacia."
+    google_genai = get_backend("google.genai")
+    types = get_backend("google.genai.types")
     if google_genai is None or types is None:
         return "Error en Imagen: falta dependencia 'google-genai'. Ejecuta: pip install -r requirements.txt"
 
     try:
         client = google_genai.Client(api_key=api_key)
-        outline = _generate_infographic_outline(client, text_content)
+        if outline is None:
+            outline = _generate_infographic_outline(client, text_content, api_key=api_key, rag_index=rag_index)
         if isinstance(outline, str):
             return f"Error en Imagen: {outline}"
 
@@ -619,7 +967,9 @@ def generate_infographic_image(text_content, api_key):
                 }
                 if content_config is not None:
                     request["config"] = content_config
-                response = client.models.generate_content(**request)
+                with _rate_limited(api_key, model_name, prompt):
+                    response = client.models.generate_content(**request)
+                record_usage("image", model_name, prompt, response)
                 image_bytes = _extract_inline_image_bytes(response)
                 if image_bytes:
                     return image_bytes
@@ -629,14 +979,16 @@ def generate_infographic_image(text_content, api_key):
 
         # Fallback opcional a Imagen API (si la cuenta tiene acceso).
         try:
-            response = client.models.generate_images(
-                model="imagen-4.0-generate-001",
-                prompt=prompt,
-                config=types.GenerateImagesConfig(
-                    number_of_images=1,
-                    output_mime_type="image/png",
-                ),
-            )
+            with _rate_limited(api_key, "imagen-4.0-generate-001", prompt):
+                response = client.models.generate_images(
+                    model="imagen-4.0-generate-001",
+                    prompt=prompt,
+                    config=types.GenerateImagesConfig(
+                        number_of_images=1,
+                        output_mime_type="image/png",
+                    ),
+                )
+            record_usage("image", "imagen-4.0-generate-001", prompt, response)
             image_bytes = _extract_image_bytes(response)
             if image_bytes:
                 return image_bytes
@@ -1,16 +1,108 @@
-from gtts import gTTS
+import re
+import time
 from io import BytesIO
 
+# gTTS y pydub se importan en el primer uso (ver utils.backends).
+from utils.backends import get_backend
+
+# Formatos de salida soportados. "mp3" es la salida nativa de gTTS (sin recodificar);
+# "opus" requiere pydub + ffmpeg y reduce el tamano para podcasts largos.
+AUDIO_FORMATS = {
+    "mp3": {"mime": "audio/mp3", "extension": "mp3"},
+    "opus": {"mime": "audio/ogg", "extension": "ogg", "codec": "libopus", "bitrate": "24k"},
+}
+
+# Un segmento que falla se reintenta solo (los ya sintetizados no se repiten).
+SEGMENT_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 1.0
+
+
+def split_script_into_segments(text, max_chars=900):
+    """Divide el guion en segmentos cortos (por turnos de dialogo) para sintetizarlos por partes."""
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n|\n", text or "") if p.strip()]
+
+    segments = []
+    current = ""
+    for paragraph in paragraphs:
+        if current and len(current) + len(paragraph) + 1 > max_chars:
+            segments.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        segments.append(current)
+    return segments
+
+
+def iter_audio_segments(text, language='es', max_chars=900):
+    """
+    Sintetiza el guion segmento a segmento.
+    Genera un buffer MP3 por segmento en cuanto esta listo, para poder reproducirlo sin esperar al resto.
+    Cada segmento se reintenta hasta SEGMENT_ATTEMPTS veces; si sigue fallando se lanza el error
+    y quien consume el generador conserva los segmentos ya recibidos.
+    """
+    gtts = get_backend("gtts")
+    if gtts is None:
+        raise RuntimeError("falta dependencia 'gTTS'. Ejecuta: pip install -r requirements.txt")
+    for segment in split_script_into_segments(text, max_chars=max_chars):
+        for attempt in range(1, SEGMENT_ATTEMPTS + 1):
+            try:
+                tts = gtts.gTTS(text=segment, lang=language, slow=False)
+                mp3_fp = BytesIO()
+                tts.write_to_fp(mp3_fp)
+                break
+            except Exception:
+                if attempt == SEGMENT_ATTEMPTS:
+                    raise
+                time.sleep(RETRY_DELAY_SECONDS * attempt)
+        mp3_fp.seek(0)
+        yield mp3_fp
+
+
+def join_audio_segments(segments):
+    """Une segmentos MP3 en un unico buffer (los frames MP3 se pueden concatenar directamente)."""
+    joined = BytesIO()
+    for segment in segments:
+        joined.write(segment.getvalue())
+    joined.seek(0)
+    return joined
+
+
+def encode_audio(mp3_fp, audio_format='mp3'):
+    """
+    Recodifica el MP3 al formato pedido.
+    Si el formato no esta disponible (falta pydub/ffmpeg), retorna el MP3 original.
+    Retorna (buffer, formato_efectivo).
+    """
+    settings = AUDIO_FORMATS.get(audio_format)
+    if audio_format == "mp3" or settings is None:
+        return mp3_fp, "mp3"
+
+    pydub = get_backend("pydub")
+    if pydub is None:
+        return mp3_fp, "mp3"
+
+    try:
+        mp3_fp.seek(0)
+        audio = pydub.AudioSegment.from_file(mp3_fp, format="mp3")
+        encoded = BytesIO()
+        audio.export(encoded, format="ogg", codec=settings["codec"], bitrate=settings["bitrate"])
+        encoded.seek(0)
+        return encoded, audio_format
+    except Exception:
+        mp3_fp.seek(0)
+        return mp3_fp, "mp3"
+
+
 def text_to_audio(text, language='es'):
     """Convierte texto a audio usando Google TTS."""
     try:
         # Usamos gTTS (Google Text-to-Speech wrapper)
-        tts = gTTS(text=text, lang=language, slow=False)
-        
+        tts = get_backend("gtts").gTTS(text=text, lang=language, slow=False)
+
         # Guardamos en memoria (buffer) en lugar de disco
         mp3_fp = BytesIO()
         tts.write_to_fp(mp3_fp)
         mp3_fp.seek(0)
         return mp3_fp
     except Exception as e:
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,213 @@
+"""
+Formato portable para guardar y cargar indices RAG de `build_rag_index`.
+
+Estructura del archivo (.p2prag):
+    8 bytes   magic b"P2PRAG01"
+    4 bytes   longitud de la cabecera (uint32, little-endian)
+    cabecera  JSON utf-8: modo, dimension, metadatos y offsets de cada chunk
+    chunks    texto utf-8 concatenado (alineado a 64 bytes)
+    vectores  embeddings float32 little-endian, fila por chunk (alineado a 64 bytes)
+
+Al cargar, el archivo se mapea en memoria: los embeddings se leen sin copia, de modo que
+varios procesos o sesiones comparten la misma copia fisica del indice.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import Sequence
+
+from services.gemini_llm import build_rag_index
+
+MAGIC = b"P2PRAG01"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+SNAPSHOT_EXTENSION = ".p2prag"
+
+
+def _padding(offset):
+    return (-offset) % ALIGNMENT
+
+
+def _section_offsets(prefix_size, chunks_size):
+    """Offsets (alineados) de la seccion de chunks y de la de embeddings."""
+    chunks_offset = prefix_size + _padding(prefix_size)
+    embeddings_offset = chunks_offset + chunks_size
+    return chunks_offset, embeddings_offset + _padding(embeddings_offset)
+
+
+class _MappedChunks(Sequence):
+    """Chunks decodificados bajo demanda desde el archivo mapeado."""
+
+    def __init__(self, buffer, base_offset, spans):
+        self._buffer = buffer
+        self._base_offset = base_offset
+        self._spans = spans
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        start, length = self._spans[idx]
+        start += self._base_offset
+        return bytes(self._buffer[start:start + length]).decode("utf-8")
+
+
+class _MappedEmbeddings(Sequence):
+    """Filas de embeddings como vistas float32 sobre el archivo mapeado (sin copia)."""
+
+    def __init__(self, floats, count, dim):
+        self._floats = floats
+        self._count = count
+        self._dim = dim
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError(idx)
+        start = idx * self._dim
+        return self._floats[start:start + self._dim]
+
+
+def export_rag_index(rag_index, path, metadata=None):
+    """Guarda el indice en `path` (escritura atomica). Retorna la ruta escrita."""
+    chunks = list((rag_index or {}).get("chunks", []))
+    embeddings = (rag_index or {}).get("embeddings", []) or []
+    dim = len(embeddings[0]) if embeddings else 0
+    if embeddings and (len(embeddings) != len(chunks) or any(len(vector) != dim for vector in embeddings)):
+        raise ValueError("Los embeddings no coinciden con los chunks.")
+
+    encoded_chunks = [chunk.encode("utf-8") for chunk in chunks]
+    spans = []
+    position = 0
+    for encoded in encoded_chunks:
+        spans.append([position, len(encoded)])
+        position += len(encoded)
+    chunks_size = position
+
+    header = {
+        "version": FORMAT_VERSION,
+        "retrieval_mode": rag_index.get("retrieval_mode", "lexical"),
+        "dim": dim,
+        "count": len(chunks),
+        "chunks": spans,
+        "dedup": rag_index.get("dedup"),
+        "metadata": metadata or {},
+    }
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    prefix = len(MAGIC) + 4 + len(header_bytes)
+    chunks_offset, embeddings_offset = _section_offsets(prefix, chunks_size)
+
+    vectors = array("f")
+    for vector in embeddings:
+        vectors.extend(float(value) for value in vector)
+    if sys.byteorder != "little":
+        vectors.byteswap()
+
+    # Temporal unico por escritor: varias sesiones pueden indexar el mismo documento a la vez.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(MAGIC)
+            handle.write(struct.pack("<I", len(header_bytes)))
+            handle.write(header_bytes)
+            handle.write(b"\0" * (chunks_offset - prefix))
+            for encoded in encoded_chunks:
+                handle.write(encoded)
+            handle.write(b"\0" * (embeddings_offset - chunks_offset - chunks_size))
+            vectors.tofile(handle)
+        # mkstemp crea el archivo solo para el propietario; el snapshot se comparte entre procesos.
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def load_rag_index(path):
+    """
+    Carga un indice guardado con `export_rag_index` mapeando el archivo en memoria.
+    Retorna un dict compatible con `build_rag_index` (chunks y embeddings de solo lectura).
+    """
+    with open(path, "rb") as handle:
+        buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buffer[:len(MAGIC)] != MAGIC:
+        buffer.close()
+        raise ValueError(f"{path} no es un indice RAG valido.")
+    (header_size,) = struct.unpack_from("<I", buffer, len(MAGIC))
+    header_start = len(MAGIC) + 4
+    header = json.loads(bytes(buffer[header_start:header_start + header_size]).decode("utf-8"))
+    if header.get("version") != FORMAT_VERSION:
+        buffer.close()
+        raise ValueError(f"Version de indice no soportada: {header.get('version')}")
+
+    count = header["count"]
+    dim = header["dim"]
+    chunks_size = sum(length for _, length in header["chunks"])
+    chunks_offset, embeddings_offset = _section_offsets(header_start + header_size, chunks_size)
+    view = memoryview(buffer)
+    embeddings = []
+    if dim:
+        start = embeddings_offset
+        raw = view[start:start + count * dim * 4]
+        if sys.byteorder == "little":
+            floats = raw.cast("f")
+        else:
+            # En maquinas big-endian no es posible evitar la copia.
+            floats = array("f", bytes(raw))
+            floats.byteswap()
+        embeddings = _MappedEmbeddings(floats, count, dim)
+
+    return {
+        "chunks": _MappedChunks(view, chunks_offset, header["chunks"]),
+        "embeddings": embeddings,
+        "retrieval_mode": header.get("retrieval_mode", "lexical"),
+        "dedup": header.get("dedup"),
+        "metadata": header.get("metadata", {}),
+    }
+
+
+def snapshot_path(cache_dir, text_content):
+    """Ruta del snapshot para un documento (clave: hash del texto extraido)."""
+    digest = hashlib.sha256((text_content or "").encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{digest}{SNAPSHOT_EXTENSION}")
+
+
+def load_or_build_rag_index(text_content, api_key, cache_dir):
+    """
+    Reutiliza el snapshot del documento si existe; si no, construye el indice y,
+    si es semantico, lo guarda para la proxima sesion o reinicio.
+    """
+    path = snapshot_path(cache_dir, text_content)
+    if os.path.exists(path):
+        try:
+            return load_rag_index(path)
+        except Exception:
+            pass
+
+    rag_index = build_rag_index(text_content, api_key)
+    if rag_index.get("retrieval_mode") == "semantic":
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            export_rag_index(rag_index, path)
+        except Exception:
+            pass
+    return rag_index
@@ -0,0 +1,226 @@
+"""
+Limitador de llamadas a Gemini compartido por todo el proceso.
+
+Cada par (API key, modelo) tiene dos token buckets: peticiones por minuto y tokens por minuto.
+Ademas, cada API key tiene un bucket comun a todos sus modelos. Las llamadas que no caben
+esperan en una cola de prioridad por key: entre las que ya tienen cupo en su modelo, las
+respuestas del chat (PRIORITY_INTERACTIVE) toman el cupo de la key antes que los embeddings
+del indice (PRIORITY_BATCH), aunque usen modelos distintos.
+"""
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_BATCH = 10
+
+DEFAULT_LIMITS = {"requests_per_minute": 60, "tokens_per_minute": 1000000}
+
+# Limites comunes a todos los modelos de una misma API key.
+KEY_LIMITS = {"requests_per_minute": 2000, "tokens_per_minute": 4000000}
+
+# Limites por modelo (se pueden ajustar con configure_limits segun la cuota de cada cuenta).
+MODEL_LIMITS = {
+    "models/text-embedding-004": {"requests_per_minute": 1500, "tokens_per_minute": 1000000},
+    "imagen-4.0-generate-001": {"requests_per_minute": 10, "tokens_per_minute": 1000000},
+}
+
+DEFAULT_TIMEOUT_SECONDS = 120
+WAIT_SAMPLES = 500
+
+
+class RateLimitTimeout(Exception):
+    """La llamada no obtuvo cupo antes del tiempo maximo de espera."""
+
+
+def estimate_tokens(text):
+    """Estimacion local de tokens (~4 caracteres por token)."""
+    return max(1, len(text or "") // 4)
+
+
+class _TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+
+class _Lane:
+    """Cola y buckets de un par (API key, modelo)."""
+
+    def __init__(self, limits):
+        self.requests = _TokenBucket(limits["requests_per_minute"])
+        self.tokens = _TokenBucket(limits["tokens_per_minute"])
+        self.waiters = []
+        self.acquired = 0
+        self.timeouts = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def wait_time(self, tokens, now):
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+
+class _KeyLane:
+    """Buckets comunes de una API key y cola de prioridad de todas sus llamadas pendientes."""
+
+    def __init__(self, limits):
+        self.requests = _TokenBucket(limits["requests_per_minute"])
+        self.tokens = _TokenBucket(limits["tokens_per_minute"])
+        # entrada (prioridad, secuencia) -> (cola del modelo, tokens)
+        self.waiters = {}
+
+    def first_ready(self, now):
+        """Entrada mas prioritaria que ya tiene cupo en su modelo (o None)."""
+        for entry in sorted(self.waiters):
+            lane, tokens = self.waiters[entry]
+            if lane.waiters[0] == entry and lane.wait_time(tokens, now) == 0:
+                return entry
+        return None
+
+
+class RateLimiter:
+    def __init__(self, default_limits=None, model_limits=None, key_limits=None):
+        self.default_limits = dict(default_limits or DEFAULT_LIMITS)
+        self.model_limits = {model: dict(limits) for model, limits in (model_limits or MODEL_LIMITS).items()}
+        self.key_limits = dict(key_limits or KEY_LIMITS)
+        self._lanes = {}
+        self._key_lanes = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def configure_limits(self, model, requests_per_minute=None, tokens_per_minute=None):
+        """Ajusta los limites de un modelo; aplica a las colas que se creen despues."""
+        with self._condition:
+            limits = dict(self.model_limits.get(model, self.default_limits))
+            if requests_per_minute:
+                limits["requests_per_minute"] = requests_per_minute
+            if tokens_per_minute:
+                limits["tokens_per_minute"] = tokens_per_minute
+            self.model_limits[model] = limits
+            for lane_key in [key for key in self._lanes if key[1] == model]:
+                if not self._lanes[lane_key].waiters:
+                    del self._lanes[lane_key]
+
+    def configure_key_limits(self, requests_per_minute=None, tokens_per_minute=None):
+        """Ajusta los limites comunes por API key; aplica a las keys que se vean despues."""
+        with self._condition:
+            if requests_per_minute:
+                self.key_limits["requests_per_minute"] = requests_per_minute
+            if tokens_per_minute:
+                self.key_limits["tokens_per_minute"] = tokens_per_minute
+            for key_id in [key_id for key_id, key_lane in self._key_lanes.items() if not key_lane.waiters]:
+                del self._key_lanes[key_id]
+
+    def _lane(self, api_key, model):
+        key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+        lane_key = (key_id, model)
+        lane = self._lanes.get(lane_key)
+        if lane is None:
+            lane = _Lane(self.model_limits.get(model, self.default_limits))
+            self._lanes[lane_key] = lane
+        key_lane = self._key_lanes.get(key_id)
+        if key_lane is None:
+            key_lane = _KeyLane(self.key_limits)
+            self._key_lanes[key_id] = key_lane
+        return lane, key_lane
+
+    def acquire(self, api_key, model, tokens=1, priority=PRIORITY_DEFAULT, timeout=DEFAULT_TIMEOUT_SECONDS):
+        """
+        Bloquea hasta que haya cupo para la llamada.
+        Retorna los segundos esperados; lanza RateLimitTimeout si se supera `timeout`.
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+
+        with self._condition:
+            lane, key_lane = self._lane(api_key, model)
+            entry = (priority, next(self._sequence))
+            heapq.heappush(lane.waiters, entry)
+            key_lane.waiters[entry] = (lane, tokens)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if lane.waiters[0] == entry:
+                        wait = lane.wait_time(tokens, now)
+                        # Con cupo en el modelo, el cupo de la key va a la llamada lista mas prioritaria.
+                        if wait == 0 and key_lane.first_ready(now) == entry:
+                            wait = max(key_lane.requests.wait_time(1, now), key_lane.tokens.wait_time(tokens, now))
+                            if wait == 0:
+                                for bucket_owner in (lane, key_lane):
+                                    bucket_owner.requests.take(1)
+                                    bucket_owner.tokens.take(tokens)
+                                break
+                        elif wait == 0:
+                            wait = None
+
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            lane.timeouts += 1
+                            raise RateLimitTimeout(f"Sin cupo para {model} tras {timeout:g} s")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._condition.wait(wait)
+            finally:
+                key_lane.waiters.pop(entry, None)
+                lane.waiters.remove(entry)
+                heapq.heapify(lane.waiters)
+                self._condition.notify_all()
+
+            waited = time.monotonic() - start
+            lane.acquired += 1
+            lane.waits.append(waited)
+        return waited
+
+    @contextmanager
+    def limit(self, api_key, model, tokens=1, priority=PRIORITY_DEFAULT, timeout=DEFAULT_TIMEOUT_SECONDS):
+        self.acquire(api_key, model, tokens=tokens, priority=priority, timeout=timeout)
+        yield
+
+    def metrics(self):
+        """Profundidad de cola y tiempos de espera por (API key, modelo)."""
+        with self._condition:
+            report = {}
+            for (key_id, model), lane in self._lanes.items():
+                waits = sorted(lane.waits)
+                report[f"{key_id}:{model}"] = {
+                    "queue_depth": len(lane.waiters),
+                    "acquired": lane.acquired,
+                    "timeouts": lane.timeouts,
+                    "wait_p50_seconds": waits[len(waits) // 2] if waits else 0.0,
+                    "wait_p95_seconds": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                    "wait_max_seconds": waits[-1] if waits else 0.0,
+                }
+            return report
+
+    def queue_depth(self):
+        with self._condition:
+            return sum(len(lane.waiters) for lane in self._lanes.values())
+
+
+_limiter = RateLimiter()
+
+
+def get_rate_limiter():
+    """Retorna el limitador compartido por el proceso."""
+    return _limiter
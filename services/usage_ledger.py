@@ -0,0 +1,213 @@
+"""
+Registro local de uso de tokens por etapa, documento y sesion.
+
+Cada llamada a Gemini guarda los tokens de entrada/salida que informa la respuesta
+(`usage_metadata`) o, si no vienen, una estimacion local. Los registros se guardan en SQLite
+y se pueden agregar por etapa, documento o sesion.
+
+Ruta del ledger: variable PAPER_TO_PODCAST_LEDGER_PATH (por defecto ./usage_ledger.sqlite3).
+
+Uso:
+    python -m services.usage_ledger [--by stage|model|document_hash|session_id] [--session ID]
+"""
+import argparse
+import atexit
+import contextvars
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from services.rate_limiter import estimate_tokens
+
+DEFAULT_LEDGER_PATH = "usage_ledger.sqlite3"
+GROUP_COLUMNS = ("stage", "model", "document_hash", "session_id")
+
+# Los registros se acumulan en memoria y se escriben en lote (un commit por lote).
+FLUSH_EVERY_RECORDS = 100
+FLUSH_EVERY_SECONDS = 5.0
+
+_current_session = contextvars.ContextVar("usage_session_id", default=None)
+_current_document = contextvars.ContextVar("usage_document_hash", default=None)
+
+
+@contextmanager
+def usage_context(session_id=None, document_hash=None):
+    """Asocia las llamadas hechas dentro del bloque a una sesion y un documento."""
+    session_token = _current_session.set(session_id)
+    document_token = _current_document.set(document_hash)
+    try:
+        yield
+    finally:
+        _current_session.reset(session_token)
+        _current_document.reset(document_token)
+
+
+def usage_from_response(response):
+    """Retorna (tokens_entrada, tokens_salida) de `usage_metadata`, o None si no viene."""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None and isinstance(response, dict):
+        metadata = response.get("usage_metadata")
+    if metadata is None:
+        return None
+
+    def _field(name):
+        value = metadata.get(name) if isinstance(metadata, dict) else getattr(metadata, name, None)
+        return int(value) if isinstance(value, (int, float)) else None
+
+    input_tokens = _field("prompt_token_count")
+    output_tokens = _field("candidates_token_count")
+    if input_tokens is None and output_tokens is None:
+        return None
+    return input_tokens or 0, output_tokens or 0
+
+
+class UsageLedger:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                stage TEXT NOT NULL,
+                model TEXT NOT NULL,
+                document_hash TEXT,
+                session_id TEXT,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                estimated INTEGER NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+        atexit.register(self.flush)
+
+    def record(self, stage, model, input_tokens, output_tokens, estimated, document_hash=None, session_id=None):
+        with self._lock:
+            self._pending.append(
+                (time.time(), stage, model, document_hash, session_id, input_tokens, output_tokens, int(estimated))
+            )
+            if (
+                len(self._pending) >= FLUSH_EVERY_RECORDS
+                or time.monotonic() - self._last_flush >= FLUSH_EVERY_SECONDS
+            ):
+                self._flush_locked()
+
+    def flush(self):
+        """Escribe los registros pendientes."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        self._connection.executemany(
+            "INSERT INTO usage (created_at, stage, model, document_hash, session_id, "
+            "input_tokens, output_tokens, estimated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            self._pending,
+        )
+        self._connection.commit()
+        self._pending = []
+
+    def summary(self, group_by="stage", session_id=None, document_hash=None, since=None):
+        """Totales agregados por `group_by`, opcionalmente filtrados."""
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f"group_by debe ser uno de {GROUP_COLUMNS}")
+
+        filters = []
+        params = []
+        for column, value in (("session_id", session_id), ("document_hash", document_hash)):
+            if value is not None:
+                filters.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            filters.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+        with self._lock:
+            self._flush_locked()
+            rows = self._connection.execute(
+                f"SELECT {group_by}, COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(estimated) "
+                f"FROM usage {where} GROUP BY {group_by} ORDER BY SUM(input_tokens) + SUM(output_tokens) DESC",
+                params,
+            ).fetchall()
+        return [
+            {
+                group_by: key,
+                "calls": calls,
+                "input_tokens": input_tokens or 0,
+                "output_tokens": output_tokens or 0,
+                "estimated_calls": estimated or 0,
+            }
+            for key, calls, input_tokens, output_tokens, estimated in rows
+        ]
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger():
+    """Ledger compartido por el proceso (se crea en el primer uso)."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(os.environ.get("PAPER_TO_PODCAST_LEDGER_PATH", DEFAULT_LEDGER_PATH))
+        return _ledger
+
+
+def record_usage(stage, model, prompt, response=None, output_text=None):
+    """
+    Registra una llamada. Usa los tokens de la respuesta si vienen; si no, los estima.
+    Nunca lanza excepciones: el registro no debe romper la llamada principal.
+    """
+    try:
+        usage = usage_from_response(response)
+        if usage is None:
+            input_tokens = estimate_tokens(prompt)
+            output_tokens = estimate_tokens(output_text) if output_text else 0
+            estimated = True
+        else:
+            input_tokens, output_tokens = usage
+            estimated = False
+        get_usage_ledger().record(
+            stage,
+            model,
+            input_tokens,
+            output_tokens,
+            estimated,
+            document_hash=_current_document.get(),
+            session_id=_current_session.get(),
+        )
+    except Exception:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--by", default="stage", choices=GROUP_COLUMNS)
+    parser.add_argument("--session", default=None)
+    parser.add_argument("--document", default=None)
+    args = parser.parse_args(argv)
+
+    rows = get_usage_ledger().summary(group_by=args.by, session_id=args.session, document_hash=args.document)
+    print(f"{args.by:<40} {'llamadas':>9} {'entrada':>12} {'salida':>10} {'estimadas':>10}")
+    for row in rows:
+        print(
+            f"{str(row[args.by]):<40} {row['calls']:>9} {row['input_tokens']:>12,} "
+            f"{row['output_tokens']:>10,} {row['estimated_calls']:>10}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,561 @@
+"""
+Almacen vectorial persistente en disco para una biblioteca de PDFs.
+
+Usa un indice IVF (inverted file): los vectores se agrupan alrededor de centroides
+entrenados con k-means y cada busqueda solo recorre las listas de los `nprobe`
+centroides mas cercanos, por lo que el coste crece de forma sub-lineal con la biblioteca.
+
+Estructura en disco:
+    <root>/manifest.json                dimension, documentos (segmento y offset) y metadatos
+    <root>/centroids-<version>.f32      centroides IVF vigentes (float32 crudo)
+    <root>/docs/<id>.json               chunks y lista IVF asignada a cada chunk
+    <root>/vectors/<segmento>.f32       embeddings normalizados de muchos documentos (float32 crudo)
+
+Los embeddings se agregan a segmentos compartidos y cada segmento se mapea en memoria una
+sola vez al abrir el almacen: el numero de descriptores abiertos depende de los segmentos,
+no de los documentos, y solo se leen del disco las listas que visita cada busqueda.
+
+El IVF se re-entrena en un hilo de fondo cuando la biblioteca crece; mientras tanto las
+busquedas y las altas siguen usando los centroides y listas anteriores.
+"""
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import operator
+import os
+import random
+import sys
+import threading
+from array import array
+
+MANIFEST_VERSION = 2
+
+# Un segmento nuevo se abre cuando el actual supera este tamano.
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+FLOAT_BYTES = 4
+
+# Hasta este numero de vectores se busca por fuerza bruta; a partir de aqui se entrena el IVF.
+MIN_VECTORS_TO_TRAIN = 1024
+KMEANS_ITERATIONS = 6
+KMEANS_SAMPLE_PER_LIST = 32
+# Se re-entrena cuando la biblioteca crece este factor desde el ultimo entrenamiento,
+# para que el numero de listas siga a sqrt(n) y cada busqueda recorra una fraccion decreciente.
+RETRAIN_GROWTH_FACTOR = 2
+
+
+def _dot(vec_a, vec_b):
+    return sum(map(operator.mul, vec_a, vec_b))
+
+
+def _normalize(vector):
+    norm = math.sqrt(_dot(vector, vector))
+    if norm == 0:
+        return None
+    return array("f", (float(value) / norm for value in vector))
+
+
+def _write_floats(path, values):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as handle:
+        values.tofile(handle)
+    os.replace(tmp_path, path)
+
+
+def _read_floats(path):
+    values = array("f")
+    with open(path, "rb") as handle:
+        values.frombytes(handle.read())
+    return values
+
+
+def _map_floats(path):
+    """Vista float32 de solo lectura sobre el archivo mapeado (sin copiarlo a memoria)."""
+    if sys.byteorder != "little" or not os.path.getsize(path):
+        return _read_floats(path)
+    with open(path, "rb") as handle:
+        buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(buffer).cast("f")
+
+
+def _append_floats(path, values):
+    """Agrega los valores al final del archivo y retorna su offset (en floats)."""
+    with open(path, "ab") as handle:
+        handle.seek(0, os.SEEK_END)
+        offset = handle.tell() // FLOAT_BYTES
+        values.tofile(handle)
+    return offset
+
+
+def _kmeans(sample, nlist, dim, rng):
+    """k-means esferico sobre una muestra de vectores normalizados. Retorna los centroides."""
+    centroids = [array("f", vector) for vector in rng.sample(sample, min(nlist, len(sample)))]
+    for _ in range(KMEANS_ITERATIONS):
+        sums = [[0.0] * dim for _ in centroids]
+        counts = [0] * len(centroids)
+        for vector in sample:
+            best_idx = max(range(len(centroids)), key=lambda idx: _dot(vector, centroids[idx]))
+            counts[best_idx] += 1
+            acc = sums[best_idx]
+            for dim_idx, value in enumerate(vector):
+                acc[dim_idx] += value
+        for idx, acc in enumerate(sums):
+            if counts[idx]:
+                updated = _normalize(acc)
+                if updated is not None:
+                    centroids[idx] = updated
+    return centroids
+
+
+def _nearest(vector, centroids):
+    best_idx = 0
+    best_score = -2.0
+    for idx, centroid in enumerate(centroids):
+        score = _dot(vector, centroid)
+        if score > best_score:
+            best_idx, best_score = idx, score
+    return best_idx
+
+
+def _flatten(vectors):
+    flat = array("f")
+    for vector in vectors:
+        flat.extend(vector)
+    return flat
+
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _matches_filter(metadata, where):
+    if not where:
+        return True
+    for key, expected in where.items():
+        value = metadata.get(key)
+        if isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class VectorStore:
+    """Indice ANN persistente con metadatos por documento y altas/bajas incrementales."""
+
+    def __init__(self, root_dir, nprobe=8):
+        self.root_dir = root_dir
+        self.nprobe = nprobe
+        self.dim = None
+        self._documents = {}
+        self._chunks = {}
+        self._vectors = {}
+        self._assignments = {}
+        self._centroids = []
+        self._lists = []
+        self._trained_size = 0
+        self._ivf_version = 0
+        self._active_segment = 0
+        self._lock = threading.RLock()
+        # Solo un entrenamiento a la vez; el de fondo se lanza desde add_document.
+        self._train_lock = threading.Lock()
+        self._train_thread = None
+
+        os.makedirs(os.path.join(root_dir, "docs"), exist_ok=True)
+        os.makedirs(os.path.join(root_dir, "vectors"), exist_ok=True)
+        self._load()
+
+    # --- Persistencia ---
+
+    def _manifest_path(self):
+        return os.path.join(self.root_dir, "manifest.json")
+
+    def _centroids_path(self):
+        return os.path.join(self.root_dir, f"centroids-{self._ivf_version}.f32")
+
+    def _segment_path(self, segment):
+        return os.path.join(self.root_dir, "vectors", f"{segment:06d}.f32")
+
+    def _doc_path(self, doc_id, extension):
+        file_id = hashlib.sha1(str(doc_id).encode("utf-8")).hexdigest()
+        return os.path.join(self.root_dir, "docs", f"{file_id}.{extension}")
+
+    def _load(self):
+        if not os.path.exists(self._manifest_path()):
+            return
+
+        with open(self._manifest_path(), encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        self.dim = manifest.get("dim")
+        self._trained_size = manifest.get("trained_size", 0)
+        self._ivf_version = manifest.get("ivf_version", 0)
+        segments = [int(name[:-4]) for name in os.listdir(os.path.join(self.root_dir, "vectors")) if name.endswith(".f32")]
+        self._active_segment = max(segments, default=0)
+
+        # Version 1: centroides sin version y un archivo de embeddings por documento.
+        legacy_centroids = os.path.join(self.root_dir, "centroids.f32")
+        centroids_path = self._centroids_path() if manifest.get("version", 1) >= 2 else legacy_centroids
+        if self.dim and os.path.exists(centroids_path):
+            flat = _read_floats(centroids_path)
+            self._centroids = [flat[start:start + self.dim] for start in range(0, len(flat), self.dim)]
+        self._lists = [[] for _ in self._centroids]
+
+        mapped = {}
+        migrated = False
+        for doc_id, info in manifest.get("documents", {}).items():
+            with open(self._doc_path(doc_id, "json"), encoding="utf-8") as handle:
+                payload = json.load(handle)
+            self._documents[doc_id] = info
+            self._chunks[doc_id] = payload["chunks"]
+            length = info["num_chunks"] * self.dim
+            if "segment" not in info:
+                legacy_path = self._doc_path(doc_id, "f32")
+                self._vectors[doc_id] = _read_floats(legacy_path)
+                info["segment"], info["offset"] = self._append_vectors(self._vectors[doc_id])
+                os.remove(legacy_path)
+                migrated = True
+            else:
+                if info["segment"] not in mapped:
+                    mapped[info["segment"]] = _map_floats(self._segment_path(info["segment"]))
+                self._vectors[doc_id] = mapped[info["segment"]][info["offset"]:info["offset"] + length]
+
+            assignments = payload.get("assignments", [])
+            # Asignaciones de otro entrenamiento (p. ej. interrumpido a medias) se recalculan.
+            if self._centroids and (payload.get("ivf_version", 0) != self._ivf_version or len(assignments) != info["num_chunks"]):
+                assignments = [
+                    _nearest(self._vector(doc_id, chunk_idx), self._centroids)
+                    for chunk_idx in range(info["num_chunks"])
+                ]
+            self._assignments[doc_id] = assignments
+            for chunk_idx, list_idx in enumerate(assignments):
+                if 0 <= list_idx < len(self._lists):
+                    self._lists[list_idx].append((doc_id, chunk_idx))
+
+        if migrated:
+            if self._centroids:
+                _write_floats(self._centroids_path(), _flatten(self._centroids))
+            self._save_manifest()
+            for doc_id in self._documents:
+                self._save_assignments(doc_id)
+            if os.path.exists(legacy_centroids):
+                os.remove(legacy_centroids)
+
+    def _append_vectors(self, flat):
+        """Guarda los embeddings en el segmento activo. Retorna (segmento, offset)."""
+        path = self._segment_path(self._active_segment)
+        if os.path.exists(path) and os.path.getsize(path) >= SEGMENT_MAX_BYTES:
+            self._active_segment += 1
+            path = self._segment_path(self._active_segment)
+        return self._active_segment, _append_floats(path, flat)
+
+    def _release_segment(self, segment):
+        """Borra un segmento cerrado que ya no tiene documentos."""
+        if segment == self._active_segment:
+            return
+        if any(info.get("segment") == segment for info in self._documents.values()):
+            return
+        try:
+            os.remove(self._segment_path(segment))
+        except OSError:
+            pass
+
+    def _save_manifest(self):
+        _write_json(
+            self._manifest_path(),
+            {
+                "version": MANIFEST_VERSION,
+                "dim": self.dim,
+                "trained_size": self._trained_size,
+                "ivf_version": self._ivf_version,
+                "documents": self._documents,
+            },
+        )
+
+    def _save_assignments(self, doc_id):
+        _write_json(
+            self._doc_path(doc_id, "json"),
+            {
+                "chunks": self._chunks[doc_id],
+                "assignments": self._assignments[doc_id],
+                "ivf_version": self._ivf_version,
+            },
+        )
+
+    # --- Altas y bajas ---
+
+    def add_document(self, doc_id, chunks, embeddings, metadata=None):
+        """
+        Agrega (o reemplaza) un documento con sus chunks y embeddings.
+        Retorna True si se indexo; False si los datos no son validos.
+        """
+        if not chunks or len(chunks) != len(embeddings):
+            return False
+
+        normalized = [_normalize(vector) for vector in embeddings]
+        if any(vector is None for vector in normalized):
+            return False
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(normalized[0])
+            if any(len(vector) != self.dim for vector in normalized):
+                return False
+
+            previous_segment = None
+            if doc_id in self._documents:
+                previous_segment = self._documents[doc_id].get("segment")
+                self._remove_from_memory(doc_id)
+
+            flat = _flatten(normalized)
+            segment, offset = self._append_vectors(flat)
+
+            self._documents[doc_id] = {
+                "metadata": dict(metadata or {}),
+                "num_chunks": len(chunks),
+                "segment": segment,
+                "offset": offset,
+            }
+            self._chunks[doc_id] = list(chunks)
+            self._vectors[doc_id] = flat
+            self._assignments[doc_id] = []
+            if self._centroids:
+                for chunk_idx, vector in enumerate(normalized):
+                    list_idx = self._nearest_centroid(vector)
+                    self._assignments[doc_id].append(list_idx)
+                    self._lists[list_idx].append((doc_id, chunk_idx))
+
+            self._save_assignments(doc_id)
+            self._save_manifest()
+            if previous_segment is not None:
+                self._release_segment(previous_segment)
+            self._schedule_training()
+        return True
+
+    def _remove_from_memory(self, doc_id):
+        for list_idx in set(self._assignments.get(doc_id, [])):
+            if 0 <= list_idx < len(self._lists):
+                self._lists[list_idx] = [entry for entry in self._lists[list_idx] if entry[0] != doc_id]
+        self._documents.pop(doc_id, None)
+        self._chunks.pop(doc_id, None)
+        self._vectors.pop(doc_id, None)
+        self._assignments.pop(doc_id, None)
+
+    def remove_document(self, doc_id):
+        """Elimina un documento del indice y del disco."""
+        with self._lock:
+            if doc_id not in self._documents:
+                return False
+            segment = self._documents[doc_id].get("segment")
+            self._remove_from_memory(doc_id)
+            try:
+                os.remove(self._doc_path(doc_id, "json"))
+            except OSError:
+                pass
+            self._save_manifest()
+            self._release_segment(segment)
+        return True
+
+    def list_documents(self, where=None):
+        """Retorna los ids de documentos cuyos metadatos cumplen el filtro."""
+        with self._lock:
+            return [
+                doc_id
+                for doc_id, info in self._documents.items()
+                if _matches_filter(info.get("metadata", {}), where)
+            ]
+
+    def size(self):
+        with self._lock:
+            return sum(info["num_chunks"] for info in self._documents.values())
+
+    def needs_retrain(self):
+        """True si la biblioteca crecio mucho desde el ultimo entrenamiento del IVF."""
+        with self._lock:
+            size = self.size()
+            if not self._centroids:
+                return size >= MIN_VECTORS_TO_TRAIN
+            return size >= RETRAIN_GROWTH_FACTOR * max(1, self._trained_size)
+
+    def _schedule_training(self):
+        """Lanza el re-entrenamiento en un hilo de fondo si hace falta y no hay uno en curso."""
+        if self.needs_retrain() and not (self._train_thread and self._train_thread.is_alive()):
+            self._train_thread = threading.Thread(target=self._train_in_background, name="ivf-train", daemon=True)
+            self._train_thread.start()
+
+    def _train_in_background(self):
+        # Las altas que llegan durante el entrenamiento pueden volver a justificar otro.
+        while self.needs_retrain():
+            if not self.train():
+                break
+
+    def wait_for_training(self, timeout=None):
+        """Espera a que termine el re-entrenamiento de fondo (si hay uno en curso)."""
+        thread = self._train_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    # --- IVF ---
+
+    def _vector(self, doc_id, chunk_idx):
+        start = chunk_idx * self.dim
+        return self._vectors[doc_id][start:start + self.dim]
+
+    def _nearest_centroid(self, vector):
+        return _nearest(vector, self._centroids)
+
+    def train(self, nlist=None, seed=0):
+        """
+        (Re)entrena los centroides IVF con k-means esferico y reasigna todos los vectores.
+        El calculo se hace sin el lock del almacen: las busquedas y altas concurrentes usan
+        las listas anteriores hasta que se instalan las nuevas.
+        """
+        with self._train_lock:
+            with self._lock:
+                # Foto de los vectores actuales; los arrays y vistas no se modifican despues de creados.
+                snapshot = {
+                    doc_id: (self._vectors[doc_id], info["num_chunks"])
+                    for doc_id, info in self._documents.items()
+                }
+                dim = self.dim
+            entries = [(doc_id, chunk_idx) for doc_id, (_, count) in snapshot.items() for chunk_idx in range(count)]
+            if not entries:
+                return False
+
+            def vector_of(doc_id, chunk_idx):
+                start = chunk_idx * dim
+                return snapshot[doc_id][0][start:start + dim]
+
+            nlist = nlist or max(1, min(4096, int(math.sqrt(len(entries)))))
+            rng = random.Random(seed)
+            sample_size = min(len(entries), nlist * KMEANS_SAMPLE_PER_LIST)
+            sample = [vector_of(*entry) for entry in rng.sample(entries, sample_size)]
+            centroids = _kmeans(sample, nlist, dim, rng)
+            assignments = {
+                doc_id: [_nearest(vector_of(doc_id, chunk_idx), centroids) for chunk_idx in range(count)]
+                for doc_id, (_, count) in snapshot.items()
+            }
+
+            with self._lock:
+                old_centroids_path = self._centroids_path()
+                self._ivf_version += 1
+                self._centroids = centroids
+                self._lists = [[] for _ in centroids]
+                for doc_id in self._documents:
+                    if snapshot.get(doc_id, (None,))[0] is not self._vectors[doc_id]:
+                        # Documento agregado o reemplazado durante el entrenamiento.
+                        assignments[doc_id] = [
+                            _nearest(self._vector(doc_id, chunk_idx), centroids)
+                            for chunk_idx in range(self._documents[doc_id]["num_chunks"])
+                        ]
+                    self._assignments[doc_id] = assignments[doc_id]
+                    for chunk_idx, list_idx in enumerate(assignments[doc_id]):
+                        self._lists[list_idx].append((doc_id, chunk_idx))
+                _write_floats(self._centroids_path(), _flatten(centroids))
+                self._trained_size = len(entries)
+                self._save_manifest()
+                if os.path.exists(old_centroids_path):
+                    os.remove(old_centroids_path)
+                pending = list(self._documents)
+
+            # Las asignaciones se persisten documento a documento para no bloquear las busquedas;
+            # si el proceso se corta antes, _load recalcula las que quedaron con otra version.
+            for doc_id in pending:
+                with self._lock:
+                    if doc_id in self._documents and self._assignments[doc_id] is assignments.get(doc_id):
+                        self._save_assignments(doc_id)
+        return True
+
+    # --- Busqueda ---
+
+    def search(self, query_vectors, top_k=4, doc_ids=None, where=None, nprobe=None, min_score=-1.0):
+        """
+        Busca los chunks mas parecidos a cualquiera de los vectores de consulta.
+        `doc_ids` y `where` restringen la busqueda a un subconjunto de documentos.
+        Retorna una lista de dicts: doc_id, chunk_index, chunk, score.
+        """
+        queries = [vector for vector in (_normalize(q) for q in query_vectors or []) if vector is not None]
+        with self._lock:
+            if not queries or not self._documents:
+                return []
+            queries = [query for query in queries if len(query) == self.dim]
+            if not queries:
+                return []
+
+            allowed = set(self._documents) if doc_ids is None else set(doc_ids).intersection(self._documents)
+            if where:
+                allowed = {
+                    doc_id for doc_id in allowed
+                    if _matches_filter(self._documents[doc_id].get("metadata", {}), where)
+                }
+            if not allowed:
+                return []
+
+            candidates = self._candidates(queries, allowed, nprobe or self.nprobe)
+
+            scored = []
+            for doc_id, chunk_idx in candidates:
+                vector = self._vector(doc_id, chunk_idx)
+                score = max(_dot(query, vector) for query in queries)
+                if score >= min_score:
+                    scored.append((score, doc_id, chunk_idx))
+
+            best = heapq.nlargest(top_k, scored, key=lambda item: item[0])
+            return [
+                {
+                    "doc_id": doc_id,
+                    "chunk_index": chunk_idx,
+                    "chunk": self._chunks[doc_id][chunk_idx],
+                    "score": score,
+                }
+                for score, doc_id, chunk_idx in best
+            ]
+
+    def _candidates(self, queries, allowed, nprobe):
+        subset_size = sum(self._documents[doc_id]["num_chunks"] for doc_id in allowed)
+        if not self._centroids:
+            return [(doc_id, idx) for doc_id in allowed for idx in range(self._documents[doc_id]["num_chunks"])]
+
+        # Si el filtro deja pocos vectores, recorrerlos directamente es mas barato que sondear listas.
+        average_list = self.size() / max(1, len(self._centroids))
+        if subset_size <= nprobe * average_list:
+            return [(doc_id, idx) for doc_id in allowed for idx in range(self._documents[doc_id]["num_chunks"])]
+
+        probe = set()
+        for query in queries:
+            ranked = heapq.nlargest(
+                nprobe,
+                range(len(self._centroids)),
+                key=lambda idx: _dot(query, self._centroids[idx]),
+            )
+            probe.update(ranked)
+
+        return [
+            entry
+            for list_idx in probe
+            for entry in self._lists[list_idx]
+            if entry[0] in allowed
+        ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store():
+    """
+    Biblioteca compartida por el proceso en PAPER_TO_PODCAST_LIBRARY_DIR.
+    Retorna None si la variable no esta definida (la app usa solo el indice de la sesion).
+    """
+    global _store
+    root_dir = os.environ.get("PAPER_TO_PODCAST_LIBRARY_DIR")
+    if not root_dir:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = VectorStore(root_dir)
+        return _store
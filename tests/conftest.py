@@ -0,0 +1,12 @@
+import pytest
+
+from services import usage_ledger
+
+
+@pytest.fixture(autouse=True)
+def isolated_usage_ledger(tmp_path_factory, monkeypatch):
+    """Los registros de uso de los tests van a un ledger temporal, nunca al real."""
+    ledger = usage_ledger.UsageLedger(str(tmp_path_factory.mktemp("ledger") / "usage_ledger.sqlite3"))
+    monkeypatch.setattr(usage_ledger, "_ledger", ledger)
+    yield ledger
+    ledger.flush()
@@ -0,0 +1,63 @@
+import os
+from io import BytesIO
+
+from utils.artifact_store import ArtifactStore
+
+
+def test_artifacts_spill_to_disk_over_budget_and_reload(tmp_path):
+    store = ArtifactStore(budget_bytes=1000, spill_dir=str(tmp_path))
+    old = store.put("old", "audio", b"a" * 800)
+    store.touch_session("new")
+    new = store.put("new", "audio", b"b" * 800)
+
+    usage = store.usage()
+    assert usage["memory_bytes"] <= 1000
+    assert store.get_path(old) is not None
+    assert store.get_path(new) is None
+    assert store.get(old) == b"a" * 800
+
+
+def test_prefer_disk_keeps_type_and_extension(tmp_path):
+    store = ArtifactStore(budget_bytes=10**6, spill_dir=str(tmp_path))
+    handle = store.put("s", "audio_file", BytesIO(b"ID3data"), prefer_disk=True, extension="mp3")
+
+    assert store.get_path(handle).endswith(".mp3")
+    loaded = store.get(handle)
+    assert isinstance(loaded, BytesIO) and loaded.getvalue() == b"ID3data"
+
+
+def test_idle_sessions_are_evicted_and_their_files_removed(tmp_path):
+    store = ArtifactStore(budget_bytes=10**6, spill_dir=str(tmp_path), session_ttl_seconds=60)
+    handle = store.put("s", "audio_file", b"x" * 100, prefer_disk=True)
+    path = store.get_path(handle)
+    assert store.exists(handle)
+
+    assert store.evict_idle_sessions(now=os.path.getmtime(path) + 3600) == 1
+    assert not store.exists(handle)
+    assert store.get(handle) is None
+    assert store.get_path(handle) is None
+    assert not os.path.exists(path)
+
+
+def test_unpicklable_artifact_stays_in_memory_without_leftover_file(tmp_path):
+    store = ArtifactStore(budget_bytes=10, spill_dir=str(tmp_path))
+    value = {"embeddings": memoryview(b"\0" * 64)}
+    handle = store.put("s", "rag_index", value)
+
+    assert store.get(handle) is value
+    assert os.listdir(tmp_path) == []
+    # No se reintenta el volcado en cada escritura.
+    store.put("s", "other", b"y" * 20)
+    assert store.get(handle) is value
+
+
+def test_close_removes_owned_spill_dir_but_not_configured_one(tmp_path):
+    owned = ArtifactStore(budget_bytes=0)
+    owned.put("s", "a", b"data")
+    owned.close()
+    assert not os.path.exists(owned.spill_dir)
+
+    configured = ArtifactStore(budget_bytes=0, spill_dir=str(tmp_path))
+    configured.put("s", "a", b"data")
+    configured.close()
+    assert os.path.isdir(tmp_path) and os.listdir(tmp_path) == []
@@ -0,0 +1,68 @@
+import pytest
+
+from services.chat_memory import ChatMemory
+
+LIST_ANSWER = (
+    "The paper makes three contributions:\n"
+    "1. A sparse attention kernel for long documents.\n"
+    "2. A retrieval benchmark built from arXiv papers.\n"
+    "3. An ablation of chunk sizes.\n"
+    "Sources: [1], [2]"
+)
+
+
+def _memory():
+    memory = ChatMemory()
+    memory.add_turn("What are the contributions of the paper?", LIST_ANSWER)
+    return memory
+
+
+@pytest.mark.parametrize("question, item", [
+    ("And what about the second one?", "retrieval benchmark"),
+    ("¿y el último?", "ablation of chunk sizes"),
+    ("Explain the first", "sparse attention kernel"),
+])
+def test_ordinal_references_resolve_to_the_listed_item(question, item):
+    memory = _memory()
+    assert memory.is_follow_up(question)
+    rewritten = memory.rewrite_query(question)
+    assert rewritten.startswith(question)
+    assert item in rewritten
+
+
+@pytest.mark.parametrize("question", ["what about it?", "¿y eso?", "How was it evaluated?", "¿Como se mide eso?"])
+def test_pronoun_follow_ups_get_previous_context(question):
+    memory = _memory()
+    assert memory.is_follow_up(question)
+    assert "contributions" in memory.rewrite_query(question)
+
+
+@pytest.mark.parametrize("question", [
+    "What is the first author's affiliation?",
+    "Which dataset was used in the last experiment?",
+    "¿Que modelo esta usando el articulo?",
+    "What are the main contributions?",
+    "¿Cual es la primera tabla del articulo?",
+    "Does this paper compare against BM25?",
+])
+def test_standalone_questions_are_not_rewritten(question):
+    memory = _memory()
+    assert not memory.is_follow_up(question)
+    assert memory.rewrite_query(question) == question
+
+
+def test_without_history_nothing_is_a_follow_up():
+    assert ChatMemory().rewrite_query("what about it?") == "what about it?"
+
+
+def test_prompt_stays_bounded_as_turns_accumulate():
+    memory = ChatMemory(recent_turns=3, summary_max_chars=500)
+    for idx in range(200):
+        memory.add_turn(f"Pregunta {idx} sobre el metodo?" + " detalle" * 50, f"Respuesta {idx}." + " texto" * 200)
+
+    assert len(memory) == 200
+    assert len(memory.summary()) <= 500
+    prompt = memory.to_prompt()
+    assert len(prompt) < 500 + 3 * 1000
+    assert "Pregunta 199" in prompt
+    assert "Pregunta 0 " not in prompt
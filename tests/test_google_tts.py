@@ -0,0 +1,77 @@
+import types
+from io import BytesIO
+
+import pytest
+
+from services import google_tts
+from services.google_tts import encode_audio, iter_audio_segments, join_audio_segments, split_script_into_segments
+from utils.backends import register_backend
+
+
+def test_segments_group_dialogue_turns_up_to_the_limit():
+    script = "Alex: hola\n\nSam: " + "a" * 30 + "\nAlex: " + "b" * 30 + "\n   \nSam: fin"
+    segments = split_script_into_segments(script, max_chars=50)
+    assert segments == ["Alex: hola\nSam: " + "a" * 30, "Alex: " + "b" * 30 + "\nSam: fin"]
+    assert all(len(segment) <= 50 for segment in segments)
+
+
+def test_long_turns_are_kept_whole_and_empty_scripts_give_no_segments():
+    long_turn = "Sam: " + "x" * 80
+    assert split_script_into_segments(f"Alex: hola\n{long_turn}", max_chars=50) == ["Alex: hola", long_turn]
+    assert split_script_into_segments("") == []
+    assert split_script_into_segments(None) == []
+
+
+@pytest.fixture
+def without_pydub():
+    register_backend("pydub", lambda: None)
+    yield
+    register_backend("pydub")
+
+
+def test_encode_audio_falls_back_to_mp3_without_pydub(without_pydub):
+    mp3 = BytesIO(b"ID3frames")
+    assert encode_audio(mp3, "opus") == (mp3, "mp3")
+    assert encode_audio(mp3, "mp3") == (mp3, "mp3")
+    assert encode_audio(mp3, "flac") == (mp3, "mp3")
+
+
+@pytest.fixture
+def flaky_gtts(monkeypatch):
+    """Stub de gTTS: `failures[texto]` es cuantas veces falla ese segmento antes de funcionar."""
+    failures = {}
+    calls = []
+
+    class gTTS:
+        def __init__(self, text, lang, slow):
+            self.text = text
+
+        def write_to_fp(self, handle):
+            calls.append(self.text)
+            if failures.get(self.text, 0) > 0:
+                failures[self.text] -= 1
+                raise ConnectionError("gTTS no responde")
+            handle.write(self.text.encode("utf-8"))
+
+    register_backend("gtts", lambda: types.SimpleNamespace(gTTS=gTTS))
+    monkeypatch.setattr(google_tts, "RETRY_DELAY_SECONDS", 0)
+    yield failures, calls
+    register_backend("gtts")
+
+
+def test_only_the_failed_segment_is_retried(flaky_gtts):
+    failures, calls = flaky_gtts
+    failures["Sam: dos"] = 2
+    segments = list(iter_audio_segments("Alex: uno\nSam: dos\nAlex: tres", max_chars=10))
+    assert join_audio_segments(segments).getvalue() == "Alex: unoSam: dosAlex: tres".encode("utf-8")
+    assert calls == ["Alex: uno", "Sam: dos", "Sam: dos", "Sam: dos", "Alex: tres"]
+
+
+def test_segments_before_a_persistent_failure_are_kept(flaky_gtts):
+    failures, _ = flaky_gtts
+    failures["Sam: dos"] = google_tts.SEGMENT_ATTEMPTS
+    received = []
+    with pytest.raises(ConnectionError):
+        for segment in iter_audio_segments("Alex: uno\nSam: dos\nAlex: tres", max_chars=10):
+            received.append(segment)
+    assert [segment.getvalue() for segment in received] == [b"Alex: uno"]
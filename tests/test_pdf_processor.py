@@ -0,0 +1,61 @@
+import pytest
+
+from utils import pdf_processor
+from utils.backends import is_loaded, register_backend
+
+STUB_MODULES = ("stub.fast", "stub.partial", "stub.slow", "stub.missing")
+
+
+@pytest.fixture
+def stub_backends(monkeypatch):
+    """Registra backends de prueba; `pages[nombre]` es lo que extrae cada uno (o la excepcion que lanza)."""
+    pages = {}
+
+    def extractor(name):
+        def extract(data):
+            if isinstance(pages[name], Exception):
+                raise pages[name]
+            return pages[name]
+        return extract
+
+    for module in STUB_MODULES[:-1]:
+        register_backend(module, lambda: object())
+    register_backend("stub.missing", lambda: None)
+    monkeypatch.setattr(
+        pdf_processor,
+        "PDF_BACKENDS",
+        {module.split(".")[1]: (module, extractor(module.split(".")[1])) for module in STUB_MODULES},
+    )
+    yield pages
+    for module in STUB_MODULES:
+        register_backend(module)
+
+
+def test_first_complete_backend_wins_without_loading_the_rest(stub_backends):
+    stub_backends.update(fast=["uno", "dos"], partial=["x"], slow=["y"])
+    assert pdf_processor.extract_pages(b"%PDF") == (["uno", "dos"], "fast")
+    assert not is_loaded("stub.partial") and not is_loaded("stub.slow")
+
+
+def test_failing_backend_falls_back_to_the_next(stub_backends):
+    stub_backends.update(fast=ValueError("pdf cifrado"), partial=["uno", "dos"])
+    assert pdf_processor.extract_pages(b"%PDF") == (["uno", "dos"], "partial")
+
+
+def test_too_many_empty_pages_tries_the_next_backend(stub_backends):
+    stub_backends.update(fast=["texto", "", ""], partial=["texto", "mas", ""])
+    assert pdf_processor.extract_pages(b"%PDF") == (["texto", "mas", ""], "partial")
+
+
+def test_best_partial_result_is_used_when_none_is_complete(stub_backends):
+    stub_backends.update(fast=["", "", "a"], partial=["", "", "bastante texto"], slow=RuntimeError("roto"))
+    assert pdf_processor.extract_pages(b"%PDF") == (["", "", "bastante texto"], "partial")
+
+
+def test_errors_surface_when_no_backend_works(stub_backends):
+    stub_backends.update(fast=ValueError("a"), partial=ValueError("b"), slow=ValueError("ultimo"))
+    with pytest.raises(ValueError, match="ultimo"):
+        pdf_processor.extract_pages(b"%PDF")
+    with pytest.raises(RuntimeError, match="falta dependencia"):
+        pdf_processor.extract_pages(b"%PDF", backends=["missing"])
+    assert pdf_processor.extract_text_from_pdf(b"%PDF").startswith("Error al leer el PDF")
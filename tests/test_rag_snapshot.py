@@ -0,0 +1,82 @@
+import os
+import threading
+
+import pytest
+
+from services import rag_snapshot
+from services.rag_snapshot import export_rag_index, load_or_build_rag_index, load_rag_index, snapshot_path
+
+
+def _index(chunks, dim=4, offset=0.0):
+    return {
+        "chunks": chunks,
+        "embeddings": [[offset + idx + dim_idx / 10.0 for dim_idx in range(dim)] for idx in range(len(chunks))],
+        "retrieval_mode": "semantic",
+        "dedup": {"chunks_before": len(chunks), "chunks_after": len(chunks)},
+    }
+
+
+def test_round_trip_preserves_chunks_embeddings_and_metadata(tmp_path):
+    rag_index = _index(["primer fragmento", "segundo fragmento con acentos: canción", ""])
+    path = export_rag_index(rag_index, str(tmp_path / "doc.p2prag"), metadata={"name": "paper.pdf"})
+
+    loaded = load_rag_index(path)
+
+    assert list(loaded["chunks"]) == rag_index["chunks"]
+    assert len(loaded["embeddings"]) == 3
+    for loaded_vector, vector in zip(loaded["embeddings"], rag_index["embeddings"]):
+        assert list(loaded_vector) == pytest.approx(vector)
+    assert loaded["embeddings"][-1] == loaded["embeddings"][2]
+    assert loaded["retrieval_mode"] == "semantic"
+    assert loaded["dedup"] == rag_index["dedup"]
+    assert loaded["metadata"] == {"name": "paper.pdf"}
+
+
+def test_invalid_files_are_rejected(tmp_path):
+    path = tmp_path / "broken.p2prag"
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        load_rag_index(str(path))
+
+
+def test_concurrent_writers_leave_a_valid_snapshot_and_no_temp_files(tmp_path):
+    path = str(tmp_path / "shared.p2prag")
+    indexes = [
+        _index([f"writer {writer} chunk {idx}" for idx in range(2000)], dim=32, offset=writer)
+        for writer in range(4)
+    ]
+    errors = []
+
+    def write(rag_index):
+        for _ in range(5):
+            try:
+                export_rag_index(rag_index, path)
+            except Exception as error:
+                errors.append(error)
+
+    threads = [threading.Thread(target=write, args=(rag_index,)) for rag_index in indexes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    loaded = load_rag_index(path)
+    assert list(loaded["chunks"]) in [rag_index["chunks"] for rag_index in indexes]
+    assert os.listdir(tmp_path) == ["shared.p2prag"]
+
+
+def test_load_or_build_reuses_the_snapshot(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_build(text_content, api_key):
+        calls.append(text_content)
+        return _index(text_content.split("."))
+
+    monkeypatch.setattr(rag_snapshot, "build_rag_index", fake_build)
+    first = load_or_build_rag_index("uno.dos.tres", "key", str(tmp_path))
+    second = load_or_build_rag_index("uno.dos.tres", "key", str(tmp_path))
+
+    assert calls == ["uno.dos.tres"]
+    assert list(second["chunks"]) == first["chunks"]
+    assert os.path.exists(snapshot_path(str(tmp_path), "uno.dos.tres"))
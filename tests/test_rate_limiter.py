@@ -0,0 +1,38 @@
+import threading
+import time
+
+import pytest
+
+from services.rate_limiter import PRIORITY_BATCH, PRIORITY_INTERACTIVE, RateLimiter, RateLimitTimeout
+
+
+def test_interactive_call_takes_key_quota_before_batch_call_of_another_model():
+    limiter = RateLimiter(key_limits={"requests_per_minute": 120, "tokens_per_minute": 10**9})
+    for _ in range(120):
+        limiter.acquire("key", "models/text-embedding-004", priority=PRIORITY_BATCH)
+
+    order = []
+
+    def call(model, priority, label):
+        limiter.acquire("key", model, priority=priority, timeout=5)
+        order.append(label)
+
+    batch = threading.Thread(target=call, args=("models/text-embedding-004", PRIORITY_BATCH, "batch"))
+    batch.start()
+    time.sleep(0.05)
+    chat = threading.Thread(target=call, args=("gemini-3-flash-preview", PRIORITY_INTERACTIVE, "chat"))
+    chat.start()
+    batch.join()
+    chat.join()
+
+    assert order == ["chat", "batch"]
+
+
+def test_models_have_independent_buckets_under_the_key_limit():
+    limiter = RateLimiter(model_limits={"slow": {"requests_per_minute": 1, "tokens_per_minute": 10**6}})
+    limiter.acquire("key", "slow")
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("key", "slow", timeout=0.05)
+    # Otro modelo de la misma key no queda bloqueado por la cola de "slow".
+    assert limiter.acquire("key", "fast", timeout=0.05) < 0.05
+    assert limiter.queue_depth() == 0
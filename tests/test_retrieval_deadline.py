@@ -0,0 +1,69 @@
+import threading
+import time
+import types
+
+import pytest
+
+from services import gemini_llm
+from services.rate_limiter import RateLimiter
+from utils.backends import register_backend
+
+
+@pytest.fixture
+def stub_genai():
+    class GenerativeModel:
+        def __init__(self, model_name):
+            pass
+
+        def generate_content(self, prompt):
+            return types.SimpleNamespace(text="translated question")
+
+    register_backend(
+        "google.generativeai",
+        lambda: types.SimpleNamespace(
+            configure=lambda api_key: None,
+            GenerativeModel=GenerativeModel,
+            embed_content=lambda model, content, task_type: {"embedding": [1.0, 0.0]},
+        ),
+    )
+    yield
+    register_backend("google.generativeai")
+
+
+def test_late_retrieval_tasks_give_up_instead_of_holding_quota(stub_genai, monkeypatch):
+    limiter = RateLimiter(
+        default_limits={"requests_per_minute": 1, "tokens_per_minute": 10**6},
+        model_limits={"models/text-embedding-004": {"requests_per_minute": 1, "tokens_per_minute": 10**6}},
+    )
+    limiter.acquire("key", "gemini-3-flash-preview")
+    limiter.acquire("key", "models/text-embedding-004")
+    monkeypatch.setattr(gemini_llm, "get_rate_limiter", lambda: limiter)
+
+    started = time.monotonic()
+    variants, vectors = gemini_llm._gather_query_signals("what is attention", "key", True, deadline_seconds=0.2)
+    assert time.monotonic() - started < 1.0
+    assert variants == ["what is attention"] and vectors == []
+
+    # Las tareas vencidas dejan la cola del limitador en vez de esperar hasta un minuto por cupo.
+    time.sleep(0.3)
+    assert limiter.queue_depth() == 0
+
+
+def test_signals_within_deadline_are_used(stub_genai, monkeypatch):
+    monkeypatch.setattr(gemini_llm, "get_rate_limiter", lambda: RateLimiter())
+    variants, vectors = gemini_llm._gather_query_signals("what is attention", "key", True, deadline_seconds=2)
+    assert variants == ["what is attention", "translated question"]
+    assert vectors == [[1.0, 0.0], [1.0, 0.0]]
+
+
+def test_tasks_cancelled_in_a_full_pool_are_skipped(stub_genai, monkeypatch):
+    monkeypatch.setattr(gemini_llm, "get_rate_limiter", lambda: RateLimiter())
+    release = threading.Event()
+    blockers = [gemini_llm._retrieval_pool.submit(release.wait) for _ in range(gemini_llm._retrieval_pool._max_workers)]
+    try:
+        variants, vectors = gemini_llm._gather_query_signals("what is attention", "key", True, deadline_seconds=0.2)
+    finally:
+        release.set()
+        for blocker in blockers:
+            blocker.result()
+    assert variants == ["what is attention"] and vectors == []
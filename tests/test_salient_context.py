@@ -0,0 +1,37 @@
+import random
+
+from services.gemini_llm import SALIENT_CONTEXT_CHARS, _chunk_text, _select_salient_context
+
+
+def _document(words=20000, seed=0):
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randint(0, 5000)}" for _ in range(words))
+
+
+def test_short_documents_are_returned_unchanged():
+    assert _select_salient_context("texto corto") == "texto corto"
+
+
+def test_long_documents_fit_the_budget():
+    context = _select_salient_context(_document())
+    assert 0 < len(context) <= SALIENT_CONTEXT_CHARS
+
+
+def test_overlapping_rag_chunks_are_not_repeated():
+    text = _document()
+    chunks = _chunk_text(text)
+    rng = random.Random(1)
+    # Embeddings casi iguales: todos los chunks son igual de centrales y entran en bloques contiguos.
+    rag_index = {
+        "retrieval_mode": "semantic",
+        "chunks": chunks,
+        "embeddings": [[1.0, rng.random() * 0.01] for _ in chunks],
+    }
+
+    context = _select_salient_context(text, rag_index=rag_index)
+    words = context.split()
+    grams = [tuple(words[idx:idx + 10]) for idx in range(len(words) - 9)]
+    assert len(grams) == len(set(grams))
+    # Cada pasaje es texto contiguo del documento: el solapamiento se recorta sin perder palabras.
+    for passage in context.split("\n\n"):
+        assert passage in text
@@ -0,0 +1,69 @@
+import json
+import types
+
+import pytest
+
+from services import gemini_llm
+from services.rate_limiter import RateLimiter
+from utils.backends import register_backend
+
+OUTLINE = {
+    "title": "Atencion dispersa",
+    "subtitle": "Documentos largos",
+    "key_points": [{"heading": f"Punto {idx}", "detail": f"Detalle {idx}"} for idx in range(1, 5)],
+    "conclusion": "Menos memoria",
+}
+
+
+@pytest.fixture
+def fused_reply(monkeypatch):
+    """Stub de Gemini: `reply["fused"]` es la respuesta JSON (o una excepcion a lanzar)."""
+    reply = {"fused": None, "calls": []}
+
+    class GenerativeModel:
+        def __init__(self, model_name):
+            pass
+
+        def generate_content(self, prompt, generation_config=None):
+            if generation_config is None:
+                reply["calls"].append("script")
+                return types.SimpleNamespace(text="Alex: guion separado")
+            reply["calls"].append("fused")
+            if isinstance(reply["fused"], Exception):
+                raise reply["fused"]
+            return types.SimpleNamespace(text=reply["fused"])
+
+    register_backend(
+        "google.generativeai",
+        lambda: types.SimpleNamespace(configure=lambda api_key: None, GenerativeModel=GenerativeModel),
+    )
+    monkeypatch.setattr(gemini_llm, "get_rate_limiter", lambda: RateLimiter())
+    yield reply
+    register_backend("google.generativeai")
+
+
+def test_valid_fused_response_returns_script_and_outline(fused_reply):
+    fused_reply["fused"] = json.dumps({"script": " Alex: hola\nSam: adios ", "outline": OUTLINE})
+    script, outline = gemini_llm.generate_script_and_outline("texto del paper", "key")
+    assert script == "Alex: hola\nSam: adios"
+    assert outline == OUTLINE
+    assert fused_reply["calls"] == ["fused"]
+
+
+def test_invalid_outline_keeps_script_and_leaves_outline_for_the_separate_call(fused_reply):
+    incomplete = dict(OUTLINE, key_points=OUTLINE["key_points"][:2])
+    fused_reply["fused"] = json.dumps({"script": "Alex: hola", "outline": incomplete})
+    assert gemini_llm.generate_script_and_outline("texto del paper", "key") == ("Alex: hola", None)
+    assert fused_reply["calls"] == ["fused"]
+
+
+@pytest.mark.parametrize("fused", [
+    "no es json",
+    json.dumps({"outline": OUTLINE}),
+    json.dumps({"script": "   ", "outline": OUTLINE}),
+    RuntimeError("quota"),
+])
+def test_unusable_fused_response_falls_back_to_the_script_call(fused_reply, fused):
+    fused_reply["fused"] = fused
+    assert gemini_llm.generate_script_and_outline("texto del paper", "key") == ("Alex: guion separado", None)
+    assert fused_reply["calls"] == ["fused", "script"]
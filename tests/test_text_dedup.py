@@ -0,0 +1,58 @@
+from utils.text_dedup import PAGE_BREAK, dedup_chunks, strip_repeated_page_lines
+
+
+def _page(number, body):
+    return f"Journal of Testing Vol. 3\n{body}\nPage {number}"
+
+
+def test_repeated_headers_and_page_numbers_are_removed():
+    topics = ["attention", "retrieval", "training", "evaluation", "datasets", "limitations"]
+    bodies = [f"This section discusses {topic} in detail." for topic in topics]
+    text = PAGE_BREAK.join(_page(idx + 1, body) for idx, body in enumerate(bodies))
+
+    cleaned, removed = strip_repeated_page_lines(text)
+
+    assert removed == 12
+    assert "Journal of Testing" not in cleaned
+    assert "Page " not in cleaned
+    for body in bodies:
+        assert body in cleaned
+
+
+def test_body_lines_are_kept_even_when_similar_across_pages():
+    paragraph = "A long paragraph that repeats on every page. " * 5
+    endings = ["first ending", "second ending", "third ending", "fourth ending", "fifth ending"]
+    text = PAGE_BREAK.join(f"{paragraph}\n{ending}" for ending in endings)
+
+    cleaned, removed = strip_repeated_page_lines(text)
+
+    assert removed == 0
+    assert cleaned == text
+
+
+def test_short_documents_are_left_alone():
+    text = PAGE_BREAK.join(_page(idx, "body") for idx in range(2))
+    assert strip_repeated_page_lines(text) == (text, 0)
+
+
+def test_near_duplicate_chunks_are_collapsed_in_order():
+    license_text = " ".join(f"clause{idx}" for idx in range(60))
+    chunks = [
+        "introduction " + " ".join(f"intro{idx}" for idx in range(40)),
+        license_text,
+        "methods " + " ".join(f"method{idx}" for idx in range(40)),
+        license_text.replace("clause59", "clause59."),
+        license_text,
+    ]
+
+    unique, stats = dedup_chunks(chunks)
+
+    assert unique == [chunks[0], chunks[1], chunks[2]]
+    assert stats == {"chunks_before": 5, "chunks_after": 3, "embedding_calls_saved": 2}
+
+
+def test_distinct_chunks_are_all_kept():
+    chunks = [" ".join(f"topic{block}word{idx}" for idx in range(50)) for block in range(10)]
+    unique, stats = dedup_chunks(chunks)
+    assert unique == chunks
+    assert stats["embedding_calls_saved"] == 0
@@ -0,0 +1,46 @@
+import sqlite3
+import types
+
+from services import usage_ledger
+from services.usage_ledger import UsageLedger, usage_context
+
+
+def test_records_are_batched_and_summarised(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage_ledger, "FLUSH_EVERY_RECORDS", 3)
+    path = str(tmp_path / "ledger.sqlite3")
+    ledger = UsageLedger(path)
+
+    ledger.record("answer", "m", 10, 2, False, session_id="s1")
+    ledger.record("answer", "m", 5, 1, True, session_id="s2")
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 0
+
+    ledger.record("script", "m", 100, 50, False, session_id="s1")
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 3
+
+    ledger.record("answer", "m", 1, 1, False, session_id="s1")
+    rows = ledger.summary(group_by="stage", session_id="s1")
+    assert rows == [
+        {"stage": "script", "calls": 1, "input_tokens": 100, "output_tokens": 50, "estimated_calls": 0},
+        {"stage": "answer", "calls": 2, "input_tokens": 11, "output_tokens": 3, "estimated_calls": 0},
+    ]
+
+
+def test_record_usage_uses_response_metadata_or_estimates(tmp_path, monkeypatch):
+    ledger = UsageLedger(str(tmp_path / "ledger.sqlite3"))
+    monkeypatch.setattr(usage_ledger, "get_usage_ledger", lambda: ledger)
+
+    response = types.SimpleNamespace(
+        usage_metadata=types.SimpleNamespace(prompt_token_count=40, candidates_token_count=7),
+    )
+    with usage_context(session_id="s", document_hash="doc"):
+        usage_ledger.record_usage("answer", "m", "x" * 400, response)
+        usage_ledger.record_usage("translation", "m", "x" * 400, None, output_text="y" * 40)
+    usage_ledger.record_usage("script", "m", "x" * 400, None)
+
+    by_stage = {row["stage"]: row for row in ledger.summary(group_by="stage", document_hash="doc")}
+    assert (by_stage["answer"]["input_tokens"], by_stage["answer"]["output_tokens"]) == (40, 7)
+    assert by_stage["translation"]["estimated_calls"] == 1
+    assert (by_stage["translation"]["input_tokens"], by_stage["translation"]["output_tokens"]) == (100, 10)
+    assert "script" not in by_stage
@@ -0,0 +1,158 @@
+import json
+import os
+import random
+import threading
+
+import pytest
+
+from services import vector_store
+from services.vector_store import VectorStore
+
+DIM = 8
+
+
+def _random_vectors(count, seed):
+    rng = random.Random(seed)
+    return [[rng.gauss(0.0, 1.0) for _ in range(DIM)] for _ in range(count)]
+
+
+def _add(store, doc_id, count, seed, metadata=None):
+    vectors = _random_vectors(count, seed)
+    chunks = [f"{doc_id} chunk {idx}" for idx in range(count)]
+    assert store.add_document(doc_id, chunks, vectors, metadata=metadata)
+    return vectors
+
+
+def test_search_finds_exact_chunk_and_respects_filters(tmp_path):
+    store = VectorStore(str(tmp_path))
+    vectors_a = _add(store, "a", 10, seed=1, metadata={"year": 2023})
+    _add(store, "b", 10, seed=2, metadata={"year": 2024})
+
+    best = store.search([vectors_a[3]], top_k=1)[0]
+    assert (best["doc_id"], best["chunk_index"], best["chunk"]) == ("a", 3, "a chunk 3")
+
+    assert {r["doc_id"] for r in store.search([vectors_a[3]], top_k=5, doc_ids=["b"])} == {"b"}
+    assert {r["doc_id"] for r in store.search([vectors_a[3]], top_k=5, where={"year": 2024})} == {"b"}
+    assert store.list_documents(where={"year": [2023]}) == ["a"]
+
+
+def test_documents_persist_and_can_be_removed(tmp_path):
+    store = VectorStore(str(tmp_path))
+    vectors = _add(store, "a", 5, seed=3)
+    _add(store, "b", 5, seed=4)
+    assert store.remove_document("b")
+
+    reopened = VectorStore(str(tmp_path))
+    assert reopened.list_documents() == ["a"]
+    assert reopened.search([vectors[2]], top_k=1)[0]["chunk_index"] == 2
+
+
+def test_invalid_documents_are_rejected(tmp_path):
+    store = VectorStore(str(tmp_path))
+    assert not store.add_document("a", ["x", "y"], [[1.0] * DIM])
+    assert not store.add_document("a", ["x"], [[0.0] * DIM])
+    _add(store, "b", 2, seed=5)
+    assert not store.add_document("c", ["x"], [[1.0] * (DIM + 1)])
+
+
+def test_ivf_retrains_as_the_library_grows(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "MIN_VECTORS_TO_TRAIN", 64)
+    store = VectorStore(str(tmp_path), nprobe=2)
+    queries = _random_vectors(1, seed=99)
+
+    def scanned_fraction():
+        allowed = set(store.list_documents())
+        return len(store._candidates(queries, allowed, store.nprobe)) / store.size()
+
+    for idx in range(2):
+        _add(store, f"doc-{idx}", 32, seed=idx)
+    store.wait_for_training()
+    assert store._centroids
+    small_lists = len(store._centroids)
+
+    for idx in range(2, 32):
+        _add(store, f"doc-{idx}", 32, seed=idx)
+    store.wait_for_training()
+    assert not store.needs_retrain()
+    assert len(store._centroids) > small_lists
+    assert scanned_fraction() < 0.25
+
+    # Tras reabrir se usan los mismos centroides y listas.
+    reopened = VectorStore(str(tmp_path), nprobe=2)
+    assert len(reopened._centroids) == len(store._centroids)
+    assert reopened.search(queries, top_k=3) == store.search(queries, top_k=3)
+
+
+def test_training_runs_off_the_request_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "MIN_VECTORS_TO_TRAIN", 64)
+    started, release = threading.Event(), threading.Event()
+    kmeans = vector_store._kmeans
+
+    def slow_kmeans(*args):
+        started.set()
+        release.wait(5)
+        return kmeans(*args)
+
+    monkeypatch.setattr(vector_store, "_kmeans", slow_kmeans)
+    store = VectorStore(str(tmp_path), nprobe=2)
+    vectors = _add(store, "doc-0", 64, seed=0)
+    assert started.wait(5)
+
+    # Mientras se entrena, las busquedas y las altas no esperan al k-means.
+    assert store.search([vectors[5]], top_k=1)[0]["chunk_index"] == 5
+    late = _add(store, "late", 8, seed=1)
+    assert not store._centroids
+
+    release.set()
+    store.wait_for_training()
+    assert store._centroids
+    assert store.search([late[3]], top_k=1, nprobe=1)[0]["doc_id"] == "late"
+    reopened = VectorStore(str(tmp_path), nprobe=1)
+    assert reopened.search([late[3]], top_k=1)[0]["doc_id"] == "late"
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="requiere /proc")
+def test_open_store_does_not_hold_a_descriptor_per_document(tmp_path):
+    store = VectorStore(str(tmp_path))
+    for idx in range(300):
+        _add(store, f"doc-{idx}", 2, seed=idx)
+
+    before = len(os.listdir("/proc/self/fd"))
+    reopened = VectorStore(str(tmp_path))
+    assert len(os.listdir("/proc/self/fd")) - before < 5
+    assert reopened.search(_random_vectors(1, seed=7), top_k=1)
+
+
+def test_removed_and_replaced_documents_release_closed_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "SEGMENT_MAX_BYTES", 1)
+    store = VectorStore(str(tmp_path))
+    _add(store, "a", 4, seed=1)
+    _add(store, "b", 4, seed=2)
+    _add(store, "a", 4, seed=3)
+    segments = lambda: sorted(os.listdir(tmp_path / "vectors"))
+    assert segments() == ["000001.f32", "000002.f32"]
+
+    assert store.remove_document("b")
+    assert segments() == ["000002.f32"]
+    reopened = VectorStore(str(tmp_path))
+    assert reopened.list_documents() == ["a"]
+
+
+def test_version_1_libraries_are_migrated(tmp_path):
+    store = VectorStore(str(tmp_path))
+    vectors = _add(store, "a", 3, seed=1)
+    # Reconstruye el formato anterior: un .f32 por documento y sin segmentos.
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    info = manifest["documents"]["a"]
+    flat = vector_store._read_floats(str(tmp_path / "vectors" / "000000.f32"))
+    with open(store._doc_path("a", "f32"), "wb") as handle:
+        flat[info.pop("offset"):].tofile(handle)
+    info.pop("segment")
+    manifest["version"] = 1
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+    os.remove(tmp_path / "vectors" / "000000.f32")
+
+    migrated = VectorStore(str(tmp_path))
+    assert migrated.search([vectors[1]], top_k=1)[0]["chunk_index"] == 1
+    assert not os.path.exists(store._doc_path("a", "f32"))
+    assert VectorStore(str(tmp_path)).search([vectors[2]], top_k=1)[0]["chunk_index"] == 2
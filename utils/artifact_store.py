@@ -0,0 +1,275 @@
+"""
+Almacen de artefactos compartido por todo el proceso.
+
+Las sesiones de Streamlit guardan solo un handle (str); los datos pesados (texto del PDF,
+indice RAG, audio, imagen) viven aqui. Cuando la memoria usada supera el presupuesto,
+los artefactos mas grandes de las sesiones menos recientes se vuelcan a disco, y los datos
+de sesiones inactivas se eliminan.
+
+Configuracion por variables de entorno:
+    PAPER_TO_PODCAST_MEMORY_BUDGET_MB   presupuesto de memoria (por defecto 512)
+    PAPER_TO_PODCAST_SESSION_TTL        segundos de inactividad antes de expulsar una sesion (por defecto 3600)
+    PAPER_TO_PODCAST_SPILL_DIR          carpeta para volcar artefactos (por defecto, una carpeta temporal)
+"""
+import atexit
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO
+
+DEFAULT_BUDGET_MB = 512
+DEFAULT_SESSION_TTL_SECONDS = 3600
+
+
+def _estimate_size(value, _seen=None):
+    """Estimacion aproximada del tamano en memoria de un artefacto."""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, BytesIO):
+        return value.getbuffer().nbytes
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += _estimate_size(key, seen) + _estimate_size(item, seen)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            size += _estimate_size(item, seen)
+    return size
+
+
+class _Artifact:
+    __slots__ = ("session_id", "name", "kind", "extension", "value", "path", "size", "last_access", "spillable")
+
+    def __init__(self, session_id, name, kind, value, size, extension=None):
+        self.session_id = session_id
+        self.name = name
+        self.kind = kind
+        self.extension = extension or ("pkl" if kind == "object" else "bin")
+        self.value = value
+        self.path = None
+        self.size = size
+        self.last_access = time.time()
+        self.spillable = True
+
+
+class ArtifactStore:
+    """Guarda artefactos por sesion con presupuesto de memoria y volcado a disco."""
+
+    def __init__(self, budget_bytes, spill_dir=None, session_ttl_seconds=DEFAULT_SESSION_TTL_SECONDS):
+        self.budget_bytes = budget_bytes
+        self.session_ttl_seconds = session_ttl_seconds
+        # La carpeta temporal propia se borra al cerrar; en una carpeta configurada solo se borran nuestros archivos.
+        self._owns_spill_dir = not spill_dir
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="paper-to-podcast-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._artifacts = {}
+        self._session_access = {}
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        atexit.register(self.close)
+
+    # --- API publica ---
+
+    def put(self, session_id, name, value, prefer_disk=False, extension=None):
+        """
+        Guarda un artefacto y retorna su handle. Reemplaza el anterior con el mismo nombre.
+        Con `prefer_disk`, se escribe directamente a disco (util para medios que se leen por ruta o al descargar);
+        `extension` fija la extension del archivo volcado para que se detecte su tipo.
+        """
+        handle = f"{session_id}:{name}"
+        with self._lock:
+            self._discard(handle)
+            if value is None:
+                return None
+
+            if isinstance(value, BytesIO):
+                kind, stored = "bytesio", value.getvalue()
+            elif isinstance(value, (bytes, bytearray)):
+                kind, stored = "bytes", bytes(value)
+            else:
+                kind, stored = "object", value
+
+            artifact = _Artifact(session_id, name, kind, stored, _estimate_size(stored), extension)
+            self._artifacts[handle] = artifact
+            self._memory_bytes += artifact.size
+            self._session_access[session_id] = artifact.last_access
+            if prefer_disk:
+                self._spill(artifact)
+            self._enforce_budget()
+        return handle
+
+    def get(self, handle):
+        """Retorna el artefacto (recargandolo de disco si estaba volcado) o None si ya no existe."""
+        with self._lock:
+            artifact = self._artifacts.get(handle) if handle else None
+            if artifact is None:
+                return None
+
+            artifact.last_access = time.time()
+            self._session_access[artifact.session_id] = artifact.last_access
+            value = artifact.value if artifact.path is None else self._read_spilled(artifact)
+
+        if artifact.kind == "bytesio":
+            return BytesIO(value)
+        return value
+
+    def exists(self, handle):
+        """True si el artefacto sigue guardado (no se expulso ni se borro)."""
+        with self._lock:
+            return bool(handle) and handle in self._artifacts
+
+    def get_path(self, handle):
+        """Ruta en disco de un artefacto binario volcado (o None si sigue en memoria)."""
+        with self._lock:
+            artifact = self._artifacts.get(handle) if handle else None
+            if artifact is None or artifact.kind == "object":
+                return None
+            return artifact.path
+
+    def delete(self, handle):
+        with self._lock:
+            self._discard(handle)
+
+    def touch_session(self, session_id):
+        with self._lock:
+            self._session_access[session_id] = time.time()
+
+    def drop_session(self, session_id):
+        """Elimina todos los artefactos de una sesion."""
+        with self._lock:
+            for handle in [h for h, a in self._artifacts.items() if a.session_id == session_id]:
+                self._discard(handle)
+            self._session_access.pop(session_id, None)
+
+    def evict_idle_sessions(self, now=None):
+        """Expulsa los datos de sesiones inactivas mas alla del TTL. Retorna cuantas se expulsaron."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            idle = [
+                session_id
+                for session_id, last_access in self._session_access.items()
+                if now - last_access > self.session_ttl_seconds
+            ]
+            for session_id in idle:
+                self.drop_session(session_id)
+        return len(idle)
+
+    def usage(self):
+        """Uso de memoria y disco, total y por sesion."""
+        with self._lock:
+            sessions = {}
+            disk_bytes = 0
+            for artifact in self._artifacts.values():
+                entry = sessions.setdefault(
+                    artifact.session_id,
+                    {"memory_bytes": 0, "disk_bytes": 0, "artifacts": 0},
+                )
+                entry["artifacts"] += 1
+                if artifact.path is None:
+                    entry["memory_bytes"] += artifact.size
+                else:
+                    entry["disk_bytes"] += artifact.size
+                    disk_bytes += artifact.size
+            return {
+                "budget_bytes": self.budget_bytes,
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": disk_bytes,
+                "sessions": sessions,
+            }
+
+    def close(self):
+        with self._lock:
+            for handle in list(self._artifacts):
+                self._discard(handle)
+            self._session_access.clear()
+            self._memory_bytes = 0
+            if self._owns_spill_dir:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    # --- Internos ---
+
+    def _discard(self, handle):
+        artifact = self._artifacts.pop(handle, None)
+        if artifact is None:
+            return
+        if artifact.path is None:
+            self._memory_bytes -= artifact.size
+        else:
+            try:
+                os.remove(artifact.path)
+            except OSError:
+                pass
+
+    def _enforce_budget(self):
+        if self._memory_bytes <= self.budget_bytes:
+            return
+
+        # Volcamos primero los artefactos de las sesiones menos recientes y, dentro de cada una, los mas grandes.
+        in_memory = [a for a in self._artifacts.values() if a.path is None and a.spillable]
+        in_memory.sort(key=lambda a: (self._session_access.get(a.session_id, 0), -a.size))
+        for artifact in in_memory:
+            if self._memory_bytes <= self.budget_bytes:
+                break
+            self._spill(artifact)
+
+    def _spill(self, artifact):
+        path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.{artifact.extension}")
+        try:
+            with open(path, "wb") as handle:
+                if artifact.kind == "object":
+                    pickle.dump(artifact.value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+                else:
+                    handle.write(artifact.value)
+        except Exception:
+            # Objetos que no se pueden serializar (p. ej. indices mapeados desde un snapshot, que ya
+            # viven en disco) se quedan en memoria y no se vuelven a intentar.
+            artifact.spillable = False
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return
+
+        artifact.path = path
+        artifact.value = None
+        self._memory_bytes -= artifact.size
+
+    def _read_spilled(self, artifact):
+        with open(artifact.path, "rb") as handle:
+            if artifact.kind == "object":
+                return pickle.load(handle)
+            return handle.read()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Retorna el almacen compartido por el proceso (se crea con la configuracion del entorno)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            budget_mb = float(os.environ.get("PAPER_TO_PODCAST_MEMORY_BUDGET_MB", DEFAULT_BUDGET_MB))
+            ttl = float(os.environ.get("PAPER_TO_PODCAST_SESSION_TTL", DEFAULT_SESSION_TTL_SECONDS))
+            _store = ArtifactStore(
+                budget_bytes=int(budget_mb * 1024 * 1024),
+                spill_dir=os.environ.get("PAPER_TO_PODCAST_SPILL_DIR") or None,
+                session_ttl_seconds=ttl,
+            )
+        return _store
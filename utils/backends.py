@@ -0,0 +1,47 @@
+"""
+Registro de dependencias pesadas con carga diferida.
+
+Los modulos de servicios piden sus SDKs con `get_backend(nombre)` en el momento de usarlos,
+asi el arranque del proceso no paga el coste de importar librerias que quiza no se usen.
+`register_backend` permite sustituir un backend (por ejemplo, por uno local en pruebas de carga).
+"""
+import importlib
+import threading
+
+_loaders = {}
+_loaded = {}
+_lock = threading.Lock()
+_MISSING = object()
+
+
+def register_backend(name, loader=None):
+    """
+    Registra como cargar un backend. Sin `loader`, se importa el modulo `name`.
+    Si el backend ya estaba cargado, se descarta para usar el nuevo loader.
+    """
+    with _lock:
+        _loaders[name] = loader or (lambda: importlib.import_module(name))
+        _loaded.pop(name, None)
+
+
+def get_backend(name):
+    """Retorna el backend cargado (la primera vez lo importa) o None si no esta disponible."""
+    value = _loaded.get(name, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    with _lock:
+        value = _loaded.get(name, _MISSING)
+        if value is _MISSING:
+            loader = _loaders.get(name) or (lambda: importlib.import_module(name))
+            try:
+                value = loader()
+            except Exception:
+                value = None
+            _loaded[name] = value
+    return value
+
+
+def is_loaded(name):
+    """True si el backend ya se intento cargar en este proceso."""
+    return name in _loaded
@@ -1,12 +1,138 @@
-import PyPDF2
+import io
+import time
+
+# Las librerias de PDF se importan en el primer uso (ver utils.backends).
+from utils.backends import get_backend
+from utils.text_dedup import PAGE_BREAK
+
+# Si mas de esta fraccion de paginas sale vacia, se prueba el siguiente backend.
+MAX_EMPTY_PAGE_RATIO = 0.5
+
+
+def _pages_pypdf2(data):
+    PyPDF2 = get_backend("PyPDF2")
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return [page.extract_text() or "" for page in pdf_reader.pages]
+
+
+def _pages_pypdfium2(data):
+    pdfium = get_backend("pypdfium2")
+    pdf = pdfium.PdfDocument(data)
+    try:
+        pages = []
+        for page in pdf:
+            text_page = page.get_textpage()
+            pages.append(text_page.get_text_range())
+            text_page.close()
+            page.close()
+        return pages
+    finally:
+        pdf.close()
+
+
+def _pages_pdfminer(data):
+    high_level = get_backend("pdfminer.high_level")
+    text = high_level.extract_text(io.BytesIO(data))
+    # pdfminer separa las paginas con un salto de formulario.
+    return text.split("\f")[:-1] if text.endswith("\f") else text.split("\f")
+
+
+# Backends en orden de preferencia (del mas rapido al mas lento).
+# Cada entrada: nombre -> (modulo requerido, funcion que retorna el texto por pagina).
+PDF_BACKENDS = {
+    "pypdfium2": ("pypdfium2", _pages_pypdfium2),
+    "pypdf2": ("PyPDF2", _pages_pypdf2),
+    "pdfminer": ("pdfminer.high_level", _pages_pdfminer),
+}
+
+
+def available_backends():
+    """Backends instalados, en orden de preferencia."""
+    return [name for name, (module, _) in PDF_BACKENDS.items() if get_backend(module) is not None]
+
+
+def _read_bytes(uploaded_file):
+    if isinstance(uploaded_file, (bytes, bytearray)):
+        return bytes(uploaded_file)
+    if isinstance(uploaded_file, str):
+        with open(uploaded_file, "rb") as pdf_file:
+            return pdf_file.read()
+    if hasattr(uploaded_file, "getvalue"):
+        return uploaded_file.getvalue()
+    uploaded_file.seek(0)
+    return uploaded_file.read()
+
+
+def _looks_complete(pages):
+    if not pages:
+        return False
+    empty_pages = sum(1 for page in pages if not page.strip())
+    return empty_pages / len(pages) <= MAX_EMPTY_PAGE_RATIO
+
+
+def extract_pages(uploaded_file, backends=None):
+    """
+    Extrae el texto de cada pagina probando los backends en orden.
+    Si uno falla o deja demasiadas paginas vacias, se usa el siguiente.
+    Retorna (paginas, backend_usado); lanza la ultima excepcion si ninguno funciona.
+    """
+    data = _read_bytes(uploaded_file)
+
+    best = None
+    last_error = None
+    for name in backends or PDF_BACKENDS:
+        module, extract = PDF_BACKENDS[name]
+        # La disponibilidad se comprueba al llegar a cada backend: si el primero funciona,
+        # las demas librerias no se importan.
+        if get_backend(module) is None:
+            continue
+        try:
+            pages = extract(data)
+        except Exception as backend_error:
+            last_error = backend_error
+            continue
+        if _looks_complete(pages):
+            return pages, name
+        if best is None or sum(len(p) for p in pages) > sum(len(p) for p in best[0]):
+            best = (pages, name)
+
+    if best is not None:
+        return best
+    if last_error is None:
+        raise RuntimeError("falta dependencia 'PyPDF2'. Ejecuta: pip install -r requirements.txt")
+    raise last_error
+
 
 def extract_text_from_pdf(uploaded_file):
     """Extrae todo el texto de un archivo PDF subido."""
     try:
-        pdf_reader = PyPDF2.PdfReader(uploaded_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        pages, _ = extract_pages(uploaded_file)
+        # Las paginas se separan con un salto de formulario para poder detectar cabeceras/pies repetidos.
+        return PAGE_BREAK.join(page + "\n" for page in pages)
     except Exception as e:
-        return f"Error al leer el PDF: {e}"
\ No newline at end of file
+        return f"Error al leer el PDF: {e}"
+
+
+def benchmark_backends(pdf_paths, backends=None):
+    """
+    Compara los backends instalados sobre un corpus local.
+    Retorna {backend: {"pages", "seconds", "pages_per_second", "chars", "empty_pages", "failures"}}.
+    """
+    results = {}
+    for name in backends or available_backends():
+        stats = {"pages": 0, "seconds": 0.0, "chars": 0, "empty_pages": 0, "failures": 0}
+        for path in pdf_paths:
+            data = _read_bytes(path)
+            start = time.perf_counter()
+            try:
+                pages = PDF_BACKENDS[name][1](data)
+            except Exception:
+                stats["failures"] += 1
+                continue
+            stats["seconds"] += time.perf_counter() - start
+            stats["pages"] += len(pages)
+            stats["chars"] += sum(len(page) for page in pages)
+            stats["empty_pages"] += sum(1 for page in pages if not page.strip())
+        stats["pages_per_second"] = stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0
+        results[name] = stats
+    return results
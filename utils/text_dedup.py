@@ -0,0 +1,131 @@
+"""
+Limpieza de texto repetido antes de indexar.
+
+- `strip_repeated_page_lines` elimina cabeceras y pies de pagina que se repiten en muchas paginas.
+- `dedup_chunks` colapsa chunks casi identicos (licencias, boilerplate) con MinHash + LSH,
+  para no pagar embeddings de texto repetido.
+"""
+import hashlib
+import random
+import re
+
+PAGE_BREAK = "\f"
+
+# Lineas al inicio/fin de pagina que se consideran candidatas a cabecera o pie.
+EDGE_LINES = 3
+MAX_EDGE_LINE_CHARS = 120
+MIN_REPEATED_PAGES = 3
+MIN_REPEATED_RATIO = 0.5
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+DUPLICATE_THRESHOLD = 0.8
+
+_rng = random.Random(20240601)
+_HASH_MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERMUTATIONS)]
+
+
+def _normalize_line(line):
+    # Numeros de pagina y fechas cambian entre paginas; se ignoran al comparar.
+    return re.sub(r"\d+", "#", re.sub(r"\s+", " ", line.strip().lower()))
+
+
+def _edge_lines(lines):
+    non_empty = [idx for idx, line in enumerate(lines) if line.strip()]
+    edges = set(non_empty[:EDGE_LINES] + non_empty[-EDGE_LINES:])
+    # Las cabeceras y pies son lineas cortas; un parrafo nunca se trata como tal.
+    return {idx for idx in edges if len(lines[idx].strip()) <= MAX_EDGE_LINE_CHARS}
+
+
+def strip_repeated_page_lines(text):
+    """
+    Quita las lineas de cabecera/pie que se repiten en muchas paginas (separadas por '\\f').
+    Retorna (texto_limpio, lineas_eliminadas).
+    """
+    pages = (text or "").split(PAGE_BREAK)
+    if len(pages) < MIN_REPEATED_PAGES:
+        return text or "", 0
+
+    page_lines = [page.split("\n") for page in pages]
+    page_counts = {}
+    for lines in page_lines:
+        seen = {_normalize_line(lines[idx]) for idx in _edge_lines(lines)}
+        for key in seen:
+            if key and key != "#":
+                page_counts[key] = page_counts.get(key, 0) + 1
+
+    min_pages = max(MIN_REPEATED_PAGES, int(len(pages) * MIN_REPEATED_RATIO))
+    repeated = {key for key, count in page_counts.items() if count >= min_pages}
+    # Los numeros de pagina sueltos tambien se quitan.
+    repeated.add("#")
+
+    removed = 0
+    cleaned_pages = []
+    for lines in page_lines:
+        edges = _edge_lines(lines)
+        kept = []
+        for idx, line in enumerate(lines):
+            if idx in edges and _normalize_line(line) in repeated:
+                removed += 1
+                continue
+            kept.append(line)
+        cleaned_pages.append("\n".join(kept))
+    return PAGE_BREAK.join(cleaned_pages), removed
+
+
+def _minhash_signature(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[idx:idx + SHINGLE_WORDS]) for idx in range(len(words) - SHINGLE_WORDS + 1)}
+
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in shingles
+    ]
+    return tuple(min(map(mask.__xor__, hashes)) for mask in _HASH_MASKS)
+
+
+def dedup_chunks(chunks, threshold=DUPLICATE_THRESHOLD):
+    """
+    Elimina chunks casi duplicados (similitud Jaccard estimada >= `threshold`).
+    Conserva la primera aparicion y el orden original.
+    Retorna (chunks_unicos, stats).
+    """
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    buckets = {}
+    signatures = []
+    unique = []
+
+    for chunk in chunks:
+        signature = _minhash_signature(chunk)
+        band_keys = [(band, signature[band * rows:(band + 1) * rows]) for band in range(LSH_BANDS)]
+
+        candidates = set()
+        for key in band_keys:
+            candidates.update(buckets.get(key, ()))
+
+        duplicate = False
+        for kept_idx in candidates:
+            kept_signature = signatures[kept_idx]
+            agreement = sum(1 for a, b in zip(signature, kept_signature) if a == b) / NUM_PERMUTATIONS
+            if agreement >= threshold:
+                duplicate = True
+                break
+        if duplicate:
+            continue
+
+        kept_idx = len(unique)
+        unique.append(chunk)
+        signatures.append(signature)
+        for key in band_keys:
+            buckets.setdefault(key, []).append(kept_idx)
+
+    stats = {
+        "chunks_before": len(chunks),
+        "chunks_after": len(unique),
+        "embedding_calls_saved": len(chunks) - len(unique),
+    }
+    return unique, stats